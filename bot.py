@@ -5,8 +5,9 @@ import asyncio
 import re
 import sys
 import os
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Optional
 
 # Load settings using the settings manager
 from settings_manager import settings_manager, settings, config
@@ -22,7 +23,7 @@ from telegram.ext import (
 )
 from telegram.request import HTTPXRequest
 from constants import (    MAX_MESSAGE_LENGTH, MAX_ARTICLES_PER_MESSAGE, MAX_VIDEOS_PER_MESSAGE,
-    LOG_FORMAT, LOG_LEVEL
+    LOG_FORMAT, LOG_LEVEL, is_news_site, is_youtube_url
 )
 
 logging.basicConfig(
@@ -32,8 +33,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Use uvloop's libuv-based event loop for the Telegram/Discord asyncio stack when available
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.debug("Using uvloop event loop policy")
+except ImportError:
+    pass
+
 from llm_client import LLMClient, OllamaProvider
-from summarizers import NewsSummarizer, YouTubeSummarizer
+from summarizers import NewsSummarizer, YouTubeSummarizer, URL_REGEX
 from handlers import TelegramHandlers
 from conversation import ConversationManager
 from security import InputValidator, RateLimiter
@@ -69,6 +78,8 @@ TriviaPlugin = safe_import_plugin('trivia_plugin', 'TriviaPlugin')
 URLShortenerPlugin = safe_import_plugin('url_shortener_plugin', 'URLShortenerPlugin')
 from database import ChannelSettings
 
+# Placeholder tokens shipped in config examples (and the dummy token used in tests)
+_PLACEHOLDER_TOKEN_RE = re.compile(r'^(?:YOUR_.*_HERE|12345:ABCDEF)$')
 
 
 
@@ -85,7 +96,6 @@ class TelegramOllamaBot:
         # Initialize LLM client based on provider
         llm_provider = getattr(config, 'LLM_PROVIDER', 'ollama')
         llm_kwargs = {
-            'model': getattr(config, 'OLLAMA_MODEL', 'llama2'),
             'timeout': getattr(config, 'TIMEOUT', 30)
         }
 
@@ -100,7 +110,12 @@ class TelegramOllamaBot:
                 llm_provider = 'ollama'
                 llm_kwargs['host'] = getattr(config, 'OLLAMA_HOST', 'http://localhost:11434')
 
-        self.llm = LLMClient(provider=llm_provider, **llm_kwargs)
+        # OLLAMA_MODEL names an Ollama model; other providers use their own default
+        if llm_provider == 'ollama':
+            llm_kwargs['model'] = getattr(config, 'OLLAMA_MODEL', 'llama2')
+
+        # The bot's client owns the shared HTTP session and closes it at shutdown
+        self.llm = LLMClient(provider=llm_provider, owns_session=True, **llm_kwargs)
         self.news_summarizer = NewsSummarizer(self.llm)
         self.youtube_summarizer = YouTubeSummarizer(self.llm)
         self.conversation_manager = ConversationManager()
@@ -110,6 +125,13 @@ class TelegramOllamaBot:
         self.bot_username = None
         self.admin_manager = AdminManager(getattr(config, 'ADMIN_USER_IDS', []))
         self.channel_settings = {}  # In-memory cache for per-channel settings
+        self._tools_cache = None  # (enabled plugins, tool list) from _get_available_tools
+
+        # Resolve per-platform config once; run() and run_discord_bot() reuse these
+        plugin_configs = getattr(config, 'PLUGINS', {})
+        self._telegram_cfg = plugin_configs.get('telegram', {})
+        self._discord_cfg = plugin_configs.get('discord', {})
+        self._tg_timeout = getattr(config, 'TELEGRAM_API_TIMEOUT', 300.0)
 
         # Initialize database
         self._init_database()
@@ -248,7 +270,7 @@ class TelegramOllamaBot:
             if plugin_name == 'telegram':
                 config = plugin_configs.get('telegram', {})
                 bot_token = config.get('bot_token') if config else getattr(self.config, 'TELEGRAM_BOT_TOKEN', None)
-                if not bot_token or (isinstance(bot_token, str) and bot_token.startswith('YOUR_') and bot_token.endswith('_HERE')):
+                if not self._is_valid_telegram_token(bot_token):
                     logger.warning(f"Telegram plugin disabled: bot_token not configured")
                     continue
             elif plugin_name == 'discord':
@@ -276,39 +298,41 @@ class TelegramOllamaBot:
     # ---------------------------------------------------------------
 
     async def handle_message(self, update: Update, context: CallbackContext):
-        logger.debug(f"handle_message called for chat_id: {update.message.chat.id}")
         """Handle incoming messages"""
-        if update.message:
-            message_text = update.message.text
+        msg = update.message
+        if msg:
+            message_text = msg.text
             if not message_text:
                 return
+            chat = msg.chat
+            chat_id = chat.id
+            chat_type = chat.type
+            user = msg.from_user
+            user_id = user.id if user else chat_id
+            logger.debug(f"handle_message called for chat_id: {chat_id}")
 
 
 
             # SECURITY: Add message size limits
             MAX_MESSAGE_SIZE = 4096  # characters
             if len(message_text) > MAX_MESSAGE_SIZE:
-                await update.message.reply_text("🚫 Message too long. Please keep messages under 4000 characters.")
+                await msg.reply_text("🚫 Message too long. Please keep messages under 4000 characters.")
                 return
 
-            chat_id = update.message.chat.id
-            user_id = update.message.from_user.id if update.message.from_user else chat_id
-
             # Rate limiting check
             allowed, rate_limit_msg = self.rate_limiter.is_allowed(user_id, "message")
             if not allowed:
-                await update.message.reply_text(f"🚫 {rate_limit_msg}")
+                await msg.reply_text(f"🚫 {rate_limit_msg}")
                 return
 
             # Input validation
             valid, validation_msg = self.input_validator.validate_text(message_text)
             if not valid:
-                await update.message.reply_text(f"🚫 {validation_msg}")
+                await msg.reply_text(f"🚫 {validation_msg}")
                 return
 
 
 
-            chat_type = update.message.chat.type
             is_group_chat = chat_type in ["group", "supergroup"]
             bot_mentioned = False
 
@@ -337,12 +361,14 @@ class TelegramOllamaBot:
             # Process the message with AI
             logger.debug("Sending message to AI for processing")
 
+            # Scan for URLs once and split them into YouTube and news links
+            youtube_urls, news_urls = self._extract_urls(message_text)
+
             # Check for YouTube URLs first (highest priority)
-            youtube_urls = self.youtube_summarizer.extract_video_urls(message_text)
 
             if youtube_urls:
                 try:
-                    await update.message.reply_text("🎬 *YouTube video detected! Summarizing...*", parse_mode="Markdown")
+                    await msg.reply_text("🎬 *YouTube video detected! Summarizing...*", parse_mode="Markdown")
                 except Exception as e:
                     logger.warning(f"Failed to send YouTube detection message: {type(e).__name__}")
                     return
@@ -352,7 +378,7 @@ class TelegramOllamaBot:
                         # Send processing message with timeout protection
                         try:
                             await asyncio.wait_for(
-                                update.message.reply_text("⏳ Processing video..."),
+                                msg.reply_text("⏳ Processing video..."),
                                 timeout=5.0
                             )
                         except asyncio.TimeoutError:
@@ -369,38 +395,38 @@ class TelegramOllamaBot:
                                 timeout=120.0  # 2 minutes for video processing
                             )
                         except asyncio.TimeoutError:
-                            await update.message.reply_text("⏳ Video processing timed out. Please try again.")
+                            await msg.reply_text("⏳ Video processing timed out. Please try again.")
                             continue
 
                         # Send summary with timeout protection
                         try:
                             # Validate summary before sending
                             if not summary or len(summary.strip()) == 0:
-                                await update.message.reply_text("❌ Failed to generate video summary.")
+                                await msg.reply_text("❌ Failed to generate video summary.")
                                 continue
 
                             if len(summary) > MAX_MESSAGE_LENGTH:
                                 parts = [summary[i:i+MAX_MESSAGE_LENGTH] for i in range(0, len(summary), MAX_MESSAGE_LENGTH)]
                                 for i, part in enumerate(parts):
                                     await asyncio.wait_for(
-                                        update.message.reply_text(part, parse_mode="Markdown", disable_web_page_preview=i>0),
+                                        msg.reply_text(part, parse_mode="Markdown", disable_web_page_preview=i>0),
                                         timeout=10.0
                                     )
                             else:
                                 await asyncio.wait_for(
-                                    update.message.reply_text(summary, parse_mode="Markdown"),
+                                    msg.reply_text(summary, parse_mode="Markdown"),
                                     timeout=10.0
                                 )
                         except asyncio.TimeoutError:
                             logger.warning("Timeout sending video summary")
                             try:
-                                await update.message.reply_text("⏳ Summary is ready but took too long to send.")
+                                await msg.reply_text("⏳ Summary is ready but took too long to send.")
                             except:
                                 pass
                         except Exception as e:
                             logger.warning(f"Failed to send video summary: {type(e).__name__}")
                             try:
-                                await update.message.reply_text("❌ Failed to send video summary.")
+                                await msg.reply_text("❌ Failed to send video summary.")
                             except:
                                 pass
 
@@ -408,7 +434,7 @@ class TelegramOllamaBot:
                         logger.error(f"Error processing video {url}: {type(e).__name__}")
                         try:
                             await asyncio.wait_for(
-                                update.message.reply_text("❌ Failed to process video. Please try again later."),
+                                msg.reply_text("❌ Failed to process video. Please try again later."),
                                 timeout=5.0
                             )
                         except:
@@ -417,12 +443,10 @@ class TelegramOllamaBot:
                 return
 
             # Check for news URLs second
-            news_urls = self.news_summarizer.extract_urls(message_text)
-
             if news_urls:
                 try:
                     await asyncio.wait_for(
-                        update.message.reply_text("📰 *News article detected! Summarizing...*", parse_mode="Markdown"),
+                        msg.reply_text("📰 *News article detected! Summarizing...*", parse_mode="Markdown"),
                         timeout=5.0
                     )
                 except asyncio.TimeoutError:
@@ -437,7 +461,7 @@ class TelegramOllamaBot:
                         # Send processing message with timeout protection
                         try:
                             await asyncio.wait_for(
-                                update.message.reply_text("⏳ Processing article..."),
+                                msg.reply_text("⏳ Processing article..."),
                                 timeout=5.0
                             )
                         except asyncio.TimeoutError:
@@ -456,7 +480,7 @@ class TelegramOllamaBot:
                         except asyncio.TimeoutError:
                             try:
                                 await asyncio.wait_for(
-                                    update.message.reply_text("⏳ Article processing timed out. Please try again."),
+                                    msg.reply_text("⏳ Article processing timed out. Please try again."),
                                     timeout=5.0
                                 )
                             except:
@@ -469,12 +493,12 @@ class TelegramOllamaBot:
                                 parts = [summary[i:i+MAX_MESSAGE_LENGTH] for i in range(0, len(summary), MAX_MESSAGE_LENGTH)]
                                 for i, part in enumerate(parts):
                                     await asyncio.wait_for(
-                                        update.message.reply_text(part, parse_mode="Markdown", disable_web_page_preview=i>0),
+                                        msg.reply_text(part, parse_mode="Markdown", disable_web_page_preview=i>0),
                                         timeout=10.0
                                     )
                             else:
                                 await asyncio.wait_for(
-                                    update.message.reply_text(summary, parse_mode="Markdown"),
+                                    msg.reply_text(summary, parse_mode="Markdown"),
                                     timeout=10.0
                                 )
                         except asyncio.TimeoutError:
@@ -491,7 +515,7 @@ class TelegramOllamaBot:
                                 error_msg = article_data.get("error", "Unknown error")
                                 try:
                                     await asyncio.wait_for(
-                                        update.message.reply_text(f"❌ Failed to process article: {error_msg}"),
+                                        msg.reply_text(f"❌ Failed to process article: {error_msg}"),
                                         timeout=5.0
                                     )
                                 except:
@@ -499,7 +523,7 @@ class TelegramOllamaBot:
                             else:
                                 try:
                                     await asyncio.wait_for(
-                                        update.message.reply_text("❌ Failed to summarize article. Please try again later."),
+                                        msg.reply_text("❌ Failed to summarize article. Please try again later."),
                                         timeout=5.0
                                     )
                                 except:
@@ -508,7 +532,7 @@ class TelegramOllamaBot:
                             logger.error(f"Error getting article error details: {type(inner_e).__name__}")
                             try:
                                 await asyncio.wait_for(
-                                    update.message.reply_text("❌ Failed to process article. Please try again later."),
+                                    msg.reply_text("❌ Failed to process article. Please try again later."),
                                     timeout=5.0
                                 )
                             except:
@@ -520,7 +544,7 @@ class TelegramOllamaBot:
             # Send thinking message with timeout protection
             try:
                 thinking_message = await asyncio.wait_for(
-                    update.message.reply_text("🤔 Thinking…"),
+                    msg.reply_text("🤔 Thinking…"),
                     timeout=5.0
                 )
             except asyncio.TimeoutError:
@@ -531,15 +555,18 @@ class TelegramOllamaBot:
                 return
 
             # Add user message to conversation history
-            chat_id = update.message.chat.id
             self.conversation_manager.add_user_message(chat_id, message_text)
 
             # Get per-channel settings using the same method as other commands
             channel_id_str = str(chat_id)
-            channel_model = self.get_channel_setting(channel_id_str, 'model')
             channel_prompt = self.get_channel_setting(channel_id_str, 'prompt') or self.custom_prompt
             channel_provider = self.get_channel_setting(channel_id_str, 'provider') or 'ollama'  # Default to ollama
             channel_host = self.get_channel_setting(channel_id_str, 'host') if channel_provider == 'ollama' else None
+            # The global model fallback is an Ollama model name; other providers use their own default
+            if channel_provider == 'ollama':
+                channel_model = self.get_channel_setting(channel_id_str, 'model')
+            else:
+                channel_model = self.channel_settings.get(channel_id_str, {}).get('model')
 
             # Debug: Check what get_channel_setting returns
             raw_provider = self.get_channel_setting(channel_id_str, 'provider')
@@ -556,12 +583,21 @@ class TelegramOllamaBot:
 
             # Create LLM client for this channel's provider
             from llm_client import LLMClient
-            channel_llm = LLMClient(
-                provider=channel_provider,
-                model=channel_model,
-                host=channel_host,
-                api_key=api_key
-            )
+            try:
+                channel_llm = LLMClient(
+                    provider=channel_provider,
+                    model=channel_model,
+                    host=channel_host,
+                    api_key=api_key
+                )
+            except ValueError as e:
+                # Unknown provider, or no API key configured for it
+                logger.error(f"Cannot create {channel_provider} client for chat {chat_id}: {e}")
+                try:
+                    await thinking_message.edit_text(f"❌ {e}")
+                except Exception as edit_e:
+                    logger.warning(f"Failed to send provider error message: {type(edit_e).__name__}")
+                return
 
             # Get conversation context
             # Build prompt with personality
@@ -584,7 +620,13 @@ class TelegramOllamaBot:
                 # Generate final response with tool results
                 if tool_results:
                     context_with_tools = f"{context}\n\nTool Results:\n{tool_results}\n\nPlease provide your final answer based on these results."
-                    response = await channel_llm.generate(context_with_tools)
+                    try:
+                        response = await self._stream_to_message(
+                            thinking_message, channel_llm.generate_stream(context_with_tools)
+                        )
+                    except Exception as e:
+                        logger.warning(f"Streaming final answer failed ({type(e).__name__}), retrying without streaming")
+                        response = await channel_llm.generate(context_with_tools)
 
             # Add assistant response to conversation history
             self.conversation_manager.add_assistant_message(chat_id, response)
@@ -600,7 +642,7 @@ class TelegramOllamaBot:
                 # Try to send as new message instead
                 try:
                     await asyncio.wait_for(
-                        update.message.reply_text(response),
+                        msg.reply_text(response),
                         timeout=15.0
                     )
                 except asyncio.TimeoutError:
@@ -612,12 +654,41 @@ class TelegramOllamaBot:
                 # Try to send as new message instead
                 try:
                     await asyncio.wait_for(
-                        update.message.reply_text(response),
+                        msg.reply_text(response),
                         timeout=15.0
                     )
                 except Exception as inner_e:
                     logger.error(f"Failed to send fallback response message: {type(inner_e).__name__}")
 
+    async def _stream_to_message(self, message, chunks: AsyncIterator[str], interval: float = 1.0) -> str:
+        """Show streamed LLM text by editing a message at most once per interval; returns the full text"""
+        parts = []
+        last_edit = time.monotonic()
+        async for chunk in chunks:
+            parts.append(chunk)
+            now = time.monotonic()
+            if now - last_edit < interval:
+                continue
+            last_edit = now
+            partial = "".join(parts)
+            if len(partial) >= MAX_MESSAGE_LENGTH:
+                continue  # Too long to preview; the final send handles it
+            try:
+                await message.edit_text(partial + " …")
+            except Exception as e:
+                logger.debug(f"Skipping streamed preview edit: {type(e).__name__}")
+        return "".join(parts) or "No response returned."
+
+    def _extract_urls(self, text: str) -> tuple[list[str], list[str]]:
+        """Extract URLs from text in a single pass, returning (youtube_urls, news_urls)"""
+        # Most chat messages carry no links; a substring check is far cheaper than the regex
+        if 'http' not in text:
+            return [], []
+        urls = URL_REGEX.findall(text)
+        youtube_urls = [url for url in urls if is_youtube_url(url)]
+        news_urls = [url for url in urls if is_news_site(url)]
+        return youtube_urls, news_urls
+
     # ---------------------------------------------------------------
 
     async def post_init(self, application: Application) -> None:
@@ -638,19 +709,21 @@ class TelegramOllamaBot:
         await application.bot.set_my_commands(commands)
         logger.info("Bot commands set successfully.")
 
+        # Expire old conversation history in the background now that a loop is running
+        self.conversation_manager.start_cleanup_task()
+
+    async def post_shutdown(self, application: Application) -> None:
+        """Shutdown hook: stop background tasks and release pooled HTTP connections."""
+        self.conversation_manager.stop_cleanup_task()
+        await self.llm.close()
 
 
     def _is_valid_telegram_token(self, token: Optional[str]) -> bool:
         """Checks if a Telegram bot token is valid (not None, not empty, not a placeholder)."""
-        if not token:
-            return False
-        if isinstance(token, str) and (
-            token.strip() == "" or
-            token.startswith('YOUR_') and token.endswith('_HERE') or
-            token == "12345:ABCDEF" # Add check for the specific dummy token
-        ):
+        if not token or not isinstance(token, str):
             return False
-        return True
+        token = token.strip()
+        return bool(token) and not _PLACEHOLDER_TOKEN_RE.match(token)
 
     async def _test_initialize_and_run(self, app: Application):
         """Initializes the application for testing purposes and then runs the polling."""
@@ -667,6 +740,40 @@ class TelegramOllamaBot:
             logger.error(f"Test mode: Telegram API connection failed: {e}")
             return False
 
+    def _build_application(self, bot_token: str) -> Application:
+        """Build the Telegram Application and register all of its handlers."""
+        request = HTTPXRequest(connect_timeout=self._tg_timeout, read_timeout=self._tg_timeout)
+        app_builder = Application.builder().token(bot_token).request(request)
+        app_builder.post_init(self.post_init)
+        app_builder.post_shutdown(self.post_shutdown)
+        app = app_builder.build()
+
+        enabled = plugin_manager.get_enabled_plugins()
+
+        # Command handlers from plugins
+        for plugin in enabled:
+            for command in plugin.get_commands():
+                handler_method = getattr(plugin, f"handle_{command}", None)
+                if handler_method:
+                    app.add_handler(CommandHandler(command, handler_method))
+
+        # Callback query handlers from plugins
+        telegram_plugin = plugin_manager.plugins.get("telegram")
+        tg_enabled = telegram_plugin is not None and telegram_plugin in enabled
+        logger.info(f"Telegram plugin found: {telegram_plugin is not None}")
+        logger.info(f"Telegram plugin enabled: {tg_enabled}")
+        if tg_enabled:
+            logger.info("Registering callback handlers...")
+            app.add_handler(CallbackQueryHandler(telegram_plugin.handle_model_callback, pattern=r"^changemodel:"))
+            app.add_handler(CallbackQueryHandler(telegram_plugin.handle_menu_callback))
+            logger.info("Callback handlers registered")
+        else:
+            logger.error("Telegram plugin not found or not enabled - callback handlers not registered!")
+
+        # Message handler for general messages
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+        return app
+
     def run(self):
         """
         Runs the bot.
@@ -676,48 +783,20 @@ class TelegramOllamaBot:
         app = None # Initialize app to None
 
         # --- Telegram Bot Setup ---
-        telegram_config = self.config.PLUGINS.get('telegram', {})
-        bot_token = telegram_config.get('bot_token')
+        bot_token = self._telegram_cfg.get('bot_token')
 
         if self._is_valid_telegram_token(bot_token):
-            telegram_api_timeout = getattr(self.config, 'TELEGRAM_API_TIMEOUT', 300.0)
-            request = HTTPXRequest(connect_timeout=telegram_api_timeout, read_timeout=telegram_api_timeout)
-            app_builder = Application.builder().token(bot_token).request(request)
-            app_builder.post_init(self.post_init)
-            app = app_builder.build()
+            app = self._build_application(bot_token)
             telegram_bot_active = True
             logger.info("Telegram bot is configured and will attempt to start.")
-
-            # Command handlers from plugins
-            for plugin in plugin_manager.get_enabled_plugins():
-                for command in plugin.get_commands():
-                    handler_method = getattr(plugin, f"handle_{command}", None)
-                    if handler_method:
-                        app.add_handler(CommandHandler(command, handler_method))
-
-            # Callback query handlers from plugins
-            telegram_plugin = plugin_manager.plugins.get("telegram")
-            logger.info(f"Telegram plugin found: {telegram_plugin is not None}")
-            logger.info(f"Telegram plugin enabled: {plugin_manager.plugins.get('telegram') in plugin_manager.get_enabled_plugins()}")
-            if telegram_plugin and plugin_manager.plugins["telegram"] in plugin_manager.get_enabled_plugins():
-                logger.info("Registering callback handlers...")
-                app.add_handler(CallbackQueryHandler(telegram_plugin.handle_model_callback, pattern=r"^changemodel:"))
-                app.add_handler(CallbackQueryHandler(telegram_plugin.handle_menu_callback))
-                logger.info("Callback handlers registered")
-            else:
-                logger.error("Telegram plugin not found or not enabled - callback handlers not registered!")
-
-            # Message handler for general messages
-            app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         else:
             logger.warning("Telegram bot token is invalid or not configured. Telegram bot will not be started.")
             # app remains None
 
         # --- Discord Bot Setup (moved from main() to run() for consistent active check) ---
         discord_plugin = plugin_manager.plugins.get("discord")
-        if discord_plugin and plugin_manager.plugins["discord"] in plugin_manager.get_enabled_plugins():
-            discord_config = self.config.PLUGINS.get('discord', {})
-            discord_token = discord_config.get('bot_token')
+        if discord_plugin and discord_plugin in plugin_manager.get_enabled_plugins():
+            discord_token = self._discord_cfg.get('bot_token')
             if discord_token:
                 logger.info("Discord bot is configured and will attempt to start.")
                 discord_bot_active = True
@@ -743,8 +822,9 @@ class TelegramOllamaBot:
         # --- Start Discord Bot in Background (only if configured) ---
         if discord_bot_active:
             import threading
-            # Call the actual run_discord_bot method which handles starting the thread
-            threading.Thread(target=self.run_discord_bot).start()
+            # Plugin and token were already validated above, so hand them straight to the thread
+            logger.info("Starting Discord bot")
+            threading.Thread(target=discord_plugin.run_discord_bot, args=(discord_token,)).start()
             logger.info("Discord bot background thread started.")
 
         # --- Start Telegram Bot (only if configured and not in test mode) ---
@@ -755,7 +835,18 @@ class TelegramOllamaBot:
             logger.debug("Telegram polling has stopped.")
 
     def _get_available_tools(self) -> list:
-        """Get list of available tools for the LLM"""
+        """Get list of available tools for the LLM
+
+        The same list object is returned until the enabled plugins change, so the LLM
+        client can reuse the tool instructions it rendered for it. Don't mutate it.
+        """
+        enabled = tuple(plugin_manager.get_enabled_plugins())
+        if self._tools_cache is None or self._tools_cache[0] != enabled:
+            self._tools_cache = (enabled, self._build_available_tools())
+        return self._tools_cache[1]
+
+    def _build_available_tools(self) -> list:
+        """Build the tool list for the currently enabled plugins"""
         tools = []
 
         # Web search tool
@@ -898,13 +989,16 @@ class TelegramOllamaBot:
 
             calc_plugin = plugin_manager.plugins.get('calculator')
             if calc_plugin:
-                # For this test, we can directly call the plugin's _safe_eval if it's sync
-                # For async, we'd mock it or run it in a sync wrapper
+                # _safe_eval is synchronous and CPU-bound (large powers/factorials), so run it
+                # off the event loop to keep Telegram/Discord IO responsive
                 try:
-                    # Assuming _safe_eval is synchronous
-                    # If it's async, we'd need to await it and potentially mock aiohttp calls within it
-                    result = calc_plugin._safe_eval(expression)
+                    result = await asyncio.wait_for(
+                        asyncio.to_thread(calc_plugin._safe_eval, expression),
+                        timeout=2.0
+                    )
                     return f"Result: {result}"
+                except asyncio.TimeoutError:
+                    return "Calculation timed out"
                 except Exception as e:
                     return f"Calculation error: {e}"
 
@@ -937,11 +1031,14 @@ class TelegramOllamaBot:
         return f"Unknown tool: {tool_name}"
 
     def run_discord_bot(self):
-        """Run Discord bot if enabled."""
+        """Run Discord bot if enabled.
+
+        run() starts the plugin directly with its already-resolved token; this
+        entry point is kept for callers that start Discord on its own.
+        """
         discord_plugin = plugin_manager.plugins.get("discord")
         if discord_plugin and plugin_manager.plugins["discord"] in plugin_manager.get_enabled_plugins():
-            discord_config = self.config.PLUGINS.get('discord', {})
-            discord_token = discord_config.get('bot_token')
+            discord_token = self._discord_cfg.get('bot_token')
             if discord_token:
                 logger.info("Starting Discord bot")
                 discord_plugin.run_discord_bot(discord_token)
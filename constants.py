@@ -1,5 +1,10 @@
 """Constants and configuration values"""
 
+import re
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlsplit
+
 # Message limits
 MAX_MESSAGE_LENGTH = 4000
 MAX_ARTICLES_PER_MESSAGE = 2
@@ -20,6 +25,7 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 LOG_LEVEL = "INFO"
 
 # Supported news sites (regex patterns)
+# Deprecated for matching: use NEWS_SITE_REGEX / is_news_site() instead
 NEWS_SITE_PATTERNS = [
     r'bbc\.com',
     r'cnn\.com',
@@ -53,10 +59,36 @@ NEWS_SITE_PATTERNS = [
 ]
 
 # YouTube URL patterns
+# Deprecated for matching: use YOUTUBE_URL_REGEX / is_youtube_url() instead
 YOUTUBE_URL_PATTERNS = [
     r'youtube\.com/watch\?v=[\w-]+',
     r'youtube\.com/embed/[\w-]+',
     r'youtube\.com/v/[\w-]+',
     r'youtu\.be/[\w-]+',
     r'youtube\.com/shorts/[\w-]+',
-]
\ No newline at end of file
+]
+
+# Pre-compiled single-alternation matchers, built once at import
+NEWS_SITE_REGEX = re.compile("|".join(f"(?:{p})" for p in NEWS_SITE_PATTERNS), re.IGNORECASE)
+YOUTUBE_URL_REGEX = re.compile("|".join(f"(?:{p})" for p in YOUTUBE_URL_PATTERNS), re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def classify_domain(host: str) -> Optional[str]:
+    """Return the news site a hostname belongs to, or None (memoized per host)"""
+    match = NEWS_SITE_REGEX.search(host)
+    return match.group(0) if match else None
+
+
+def is_news_site(url: str) -> bool:
+    """Check whether a URL belongs to a supported news site"""
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return False
+    return host is not None and classify_domain(host) is not None
+
+
+def is_youtube_url(url: str) -> bool:
+    """Check whether a URL is a YouTube video link"""
+    return YOUTUBE_URL_REGEX.search(url) is not None
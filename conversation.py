@@ -1,21 +1,34 @@
 """Conversation context management for maintaining chat history"""
 
+import asyncio
+import io
 import logging
+import time
 from collections import defaultdict, deque
 from typing import Dict, List, Deque, Optional
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Display labels for message roles, used when rendering context lines
+_ROLE_LABEL = {"user": "User", "assistant": "Assistant", "system": "System"}
 
-@dataclass
+
+@dataclass(slots=True)
 class Message:
     """Represents a single message in conversation"""
     role: str  # "user" or "assistant"
     content: str
-    timestamp: datetime
+    timestamp_ns: int  # time.time_ns() at insert; ints keep expiry checks cheap
     token_count: Optional[int] = None
+    formatted: str = ""  # Rendered "Role: content\n" line, computed once at insert
+    formatted_len: int = 0
+
+    @property
+    def timestamp(self) -> datetime:
+        """Insert time as a naive local datetime, built on demand"""
+        return datetime.fromtimestamp(self.timestamp_ns / 1e9)
 
 
 class ConversationManager:
@@ -35,64 +48,105 @@ class ConversationManager:
         self.conversations: Dict[int, Deque[Message]] = defaultdict(
             lambda: deque(maxlen=max_messages_per_user)
         )
+        # Running total of formatted message lengths per chat
+        self._total_len: Dict[int, int] = defaultdict(int)
+        # Free-list of evicted Message objects, recycled by _append_message
+        self._msg_pool: List[Message] = []
+        self._msg_pool_max = 2 * max_messages_per_user
+        # Periodic age-based cleanup, started from a running event loop via start_cleanup_task(),
+        # or lazily by the first message added while a loop is running (any front-end)
+        self._cleanup_task: Optional[asyncio.Task] = None
 
         logger.info(f"ConversationManager initialized with max_messages={max_messages_per_user}, max_age={max_age_hours}h")
 
     def add_user_message(self, chat_id: int, content: str) -> None:
         """Add a user message to conversation history"""
-        message = Message(
-            role="user",
-            content=content,
-            timestamp=datetime.now()
-        )
-        self.conversations[chat_id].append(message)
-        self._cleanup_old_messages(chat_id)
+        self._append_message(chat_id, "user", content, time.time_ns())
         logger.debug(f"Added user message to chat {chat_id}")
 
     def add_assistant_message(self, chat_id: int, content: str) -> None:
         """Add an assistant message to conversation history"""
-        message = Message(
-            role="assistant",
-            content=content,
-            timestamp=datetime.now()
-        )
-        self.conversations[chat_id].append(message)
-        self._cleanup_old_messages(chat_id)
+        self._append_message(chat_id, "assistant", content, time.time_ns())
         logger.debug(f"Added assistant message to chat {chat_id}")
 
+    def _append_message(self, chat_id: int, role: str, content: str, timestamp_ns: int) -> None:
+        """Format a message once and append it, keeping the running length in sync"""
+        if self._cleanup_task is None:
+            self._start_cleanup_if_running()
+        conversation = self.conversations[chat_id]
+        # Evict the oldest entry ourselves when full so it can be recycled
+        if len(conversation) == conversation.maxlen:
+            evicted = conversation.popleft()
+            self._total_len[chat_id] -= evicted.formatted_len
+            self._release_message(evicted)
+
+        message = self._msg_pool.pop() if self._msg_pool else Message.__new__(Message)
+        message.role = role
+        message.content = content
+        message.timestamp_ns = timestamp_ns
+        message.token_count = None
+        message.formatted = f"{_ROLE_LABEL[role]}: {content}\n"
+        message.formatted_len = len(message.formatted)
+        conversation.append(message)
+        self._total_len[chat_id] += message.formatted_len
+
+    def _release_message(self, message: Message) -> None:
+        """Return an evicted message to the pool, dropping its text references"""
+        if len(self._msg_pool) < self._msg_pool_max:
+            message.content = ""
+            message.formatted = ""
+            self._msg_pool.append(message)
+
     def get_context(self, chat_id: int, system_prompt: str = "") -> str:
         """Get conversation context as formatted string"""
-        messages = list(self.conversations[chat_id])
-
+        messages = self.conversations[chat_id]
         if not messages:
             return system_prompt
 
-        # Build context string
-        context_parts = []
+        # Stream everything into one buffer instead of building and joining a parts list
+        buf = io.StringIO()
         if system_prompt:
-            context_parts.append(system_prompt)
-
+            buf.write(system_prompt)
+            buf.write("\n")
         total_length = len(system_prompt)
 
-        # Add messages in chronological order
-        for msg in messages:
-            msg_text = f"{msg.role.title()}: {msg.content}\n"
-            msg_length = len(msg_text)
+        # Fast path: the whole history fits, no per-message bookkeeping needed
+        if total_length + self._total_len[chat_id] <= self.max_context_length:
+            for msg in messages:
+                buf.write(msg.formatted)
+            return buf.getvalue()
 
+        # Add messages in chronological order until the context limit is reached
+        for msg in messages:
             # Check if adding this message would exceed context limit
-            if total_length + msg_length > self.max_context_length:
+            if total_length + msg.formatted_len > self.max_context_length:
                 logger.info(f"Context limit reached for chat {chat_id}, truncating history")
                 break
 
-            context_parts.append(msg_text)
-            total_length += msg_length
+            buf.write(msg.formatted)
+            total_length += msg.formatted_len
 
-        return "\n".join(context_parts)
+        return buf.getvalue()
+
+    def set_max_messages(self, max_messages_per_user: int) -> None:
+        """Change the per-chat history limit, trimming existing conversations to fit"""
+        self.max_messages_per_user = max_messages_per_user
+        self._msg_pool_max = 2 * max_messages_per_user
+        del self._msg_pool[self._msg_pool_max:]
+        self.conversations.default_factory = lambda: deque(maxlen=max_messages_per_user)
+        for chat_id, conversation in self.conversations.items():
+            new_deque = deque(conversation, maxlen=max_messages_per_user)
+            self.conversations[chat_id] = new_deque
+            self._total_len[chat_id] = sum(msg.formatted_len for msg in new_deque)
 
     def clear_conversation(self, chat_id: int) -> None:
         """Clear conversation history for a user"""
         if chat_id in self.conversations:
-            self.conversations[chat_id].clear()
+            conversation = self.conversations[chat_id]
+            for message in conversation:
+                self._release_message(message)
+            conversation.clear()
+            self._total_len[chat_id] = 0
             logger.info(f"Cleared conversation history for chat {chat_id}")
 
     def get_conversation_stats(self, chat_id: int) -> dict:
@@ -107,22 +161,61 @@ class ConversationManager:
             "newest_message": messages[-1].timestamp
         }
 
-    def _cleanup_old_messages(self, chat_id: int) -> None:
-        """Remove messages older than max_age_hours"""
-        cutoff_time = datetime.now() - timedelta(hours=self.max_age_hours)
+    def _cleanup_old_messages(self, chat_id: int, cutoff_ns: int) -> None:
+        """Remove messages older than cutoff_ns (now - max_age_hours, computed by the caller)"""
         conversation = self.conversations[chat_id]
 
         # Remove old messages from the left (oldest)
-        while conversation and conversation[0].timestamp < cutoff_time:
+        removed = 0
+        while conversation and conversation[0].timestamp_ns < cutoff_ns:
             removed_msg = conversation.popleft()
-            logger.debug(f"Removed old message from chat {chat_id}: {removed_msg.timestamp}")
+            self._total_len[chat_id] -= removed_msg.formatted_len
+            self._release_message(removed_msg)
+            removed += 1
+
+        if removed:
+            logger.debug("Removed %d old messages from chat %s", removed, chat_id)
 
     def cleanup_all_conversations(self) -> None:
         """Clean up old messages across all conversations"""
+        # "Now" doesn't meaningfully change over one pass, so read the clock once
+        cutoff_ns = time.time_ns() - self.max_age_hours * 3_600_000_000_000
         for chat_id in list(self.conversations.keys()):
-            self._cleanup_old_messages(chat_id)
+            self._cleanup_old_messages(chat_id, cutoff_ns)
             # Remove empty conversations
             if not self.conversations[chat_id]:
                 del self.conversations[chat_id]
-
-        logger.info("Cleaned up old messages across all conversations")
\ No newline at end of file
+                self._total_len.pop(chat_id, None)
+
+        logger.debug("Cleaned up old messages across all conversations")
+
+    def start_cleanup_task(self, interval: float = 300) -> None:
+        """Start the background task that expires old messages every `interval` seconds.
+
+        The deques already cap message count, so age is the only reason to prune;
+        doing it on a timer keeps it off the per-message hot path.
+        """
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.get_running_loop().create_task(self._cleanup_loop(interval))
+
+    def _start_cleanup_if_running(self) -> None:
+        """Start the cleanup task if called from a running event loop; no-op otherwise"""
+        try:
+            self.start_cleanup_task()
+        except RuntimeError:
+            pass  # No running loop (e.g. a synchronous caller); retried on the next message
+
+    def stop_cleanup_task(self) -> None:
+        """Cancel the background cleanup task if it is running"""
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+
+    async def _cleanup_loop(self, interval: float) -> None:
+        """Run cleanup_all_conversations periodically"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.cleanup_all_conversations()
+            except Exception as e:
+                logger.error(f"Conversation cleanup failed: {e}")
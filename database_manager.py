@@ -1,13 +1,69 @@
 """Manages database interactions for the Telegram Ollama Bot."""
 
+import asyncio
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import bindparam, create_engine, event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 from database import Base, ChannelSettings
 
 logger = logging.getLogger(__name__)
 
+_MISSING = object()  # Sentinel distinguishing "not cached" from a cached None
+
+# Columns of channel_settings that can be read/written as per-channel settings
+CHANNEL_SETTING_KEYS = ('provider', 'model', 'host', 'prompt')
+# Settings of a newly inserted row: the column defaults, as the upserts below write them
+_NEW_ROW_SETTINGS = {'provider': 'ollama', 'model': None, 'host': None, 'prompt': None}
+
+# Raw SQLite statements for the channel-settings hot path (schema still comes from the ORM)
+_SELECT_CHANNEL_SQL = (
+    "SELECT provider, model, host, prompt FROM channel_settings WHERE channel_id = ?"
+)
+_UPSERT_CHANNEL_SQL = {
+    key: (
+        f"INSERT INTO channel_settings (channel_id, {cols}, created_at, updated_at) "
+        f"VALUES (?, {vals}, ?, ?) "
+        f"ON CONFLICT(channel_id) DO UPDATE SET {key} = excluded.{key}, updated_at = excluded.updated_at"
+    )
+    for key, cols, vals in (
+        # New rows get the same 'ollama' provider default as the ORM model
+        (k, 'provider' if k == 'provider' else f'provider, {k}', '?' if k == 'provider' else "'ollama', ?")
+        for k in CHANNEL_SETTING_KEYS
+    )
+}
+
+
+# Statements built once at import; SQLAlchemy caches their compiled form per engine
+_STMT_GET_CHANNEL_SETTINGS = select(
+    ChannelSettings.provider,
+    ChannelSettings.model,
+    ChannelSettings.host,
+    ChannelSettings.prompt
+).where(ChannelSettings.channel_id == bindparam("cid"))
+_STMT_GET_CHANNEL_ROW = select(ChannelSettings).where(ChannelSettings.channel_id == bindparam("cid"))
+
+# Dialects whose insert() supports ON CONFLICT DO UPDATE
+_UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL journaling with relaxed fsync for SQLite connections."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 class DatabaseManager:
     """Manages database connection and channel-specific settings."""
 
@@ -15,74 +71,181 @@ class DatabaseManager:
         self.config = config
         self.db_engine = None
         self.db_session = None
-        self.channel_settings_cache = {}  # In-memory cache for per-channel settings
+        # Direct sqlite3 connection for channel settings when the database is a SQLite file
+        self._sqlite_conn: Optional[sqlite3.Connection] = None
+        self._sqlite_lock = threading.Lock()
+        # LRU cache of per-channel settings, filled lazily on first access
+        self.channel_settings_cache: OrderedDict[str, dict] = OrderedDict()
+        self._cache_max = 1024
 
         self._init_database()
-        self._load_channel_settings()
 
     def _init_database(self):
         """Initialize database connection and create tables."""
         config_dir_path = self.config.BOT_CONFIG_DIR
         db_file_path = config_dir_path / 'deepthought_bot.db'
         database_url = self.config.get('DATABASE_URL', f'sqlite:///{db_file_path}')
-        self.db_engine = create_engine(database_url, echo=False)
-        self.db_session = sessionmaker(bind=self.db_engine)
+
+        if database_url.startswith('sqlite'):
+            # SQLite file databases already default to a QueuePool of 5 (+10 overflow)
+            self.db_engine = create_engine(
+                database_url,
+                echo=False,
+                connect_args={"check_same_thread": False}
+            )
+            event.listen(self.db_engine, "connect", _set_sqlite_pragmas)
+        else:
+            self.db_engine = create_engine(
+                database_url,
+                echo=False,
+                pool_size=5,
+                max_overflow=10,
+                pool_pre_ping=True,
+                pool_recycle=3600  # Recycle before server-side idle timeouts drop connections
+            )
+
+        # One session per thread, reused across calls instead of a new one per request
+        self.db_session = scoped_session(sessionmaker(bind=self.db_engine, expire_on_commit=False))
 
         # Create tables
         Base.metadata.create_all(self.db_engine)
+
+        # For SQLite files, serve channel settings through plain sqlite3 in autocommit mode:
+        # one prepared UPSERT per write instead of query + unit-of-work flush + commit
+        db_path = self.db_engine.url.database
+        if self.db_engine.dialect.name == 'sqlite' and db_path and db_path != ':memory:':
+            self._sqlite_conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            _set_sqlite_pragmas(self._sqlite_conn, None)
+
         logger.info("Database initialized")
 
-    def _load_channel_settings(self):
-        """Load channel settings from database."""
+    def _fetch_channel_settings(self, channel_id: str) -> Optional[dict]:
+        """Read one channel's settings row from the database, or None if it has none."""
+        if self._sqlite_conn is not None:
+            with self._sqlite_lock:
+                row = self._sqlite_conn.execute(_SELECT_CHANNEL_SQL, (channel_id,)).fetchone()
+            return dict(zip(CHANNEL_SETTING_KEYS, row)) if row else None
+
         session = self.db_session()
         try:
-            settings = session.query(ChannelSettings).all()
-            for setting in settings:
-                self.channel_settings_cache[setting.channel_id] = {
-                    'provider': setting.provider,
-                    'model': setting.model,
-                    'host': setting.host,
-                    'prompt': setting.prompt
-                }
-            logger.info(f"Loaded {len(settings)} channel settings from database")
-        except Exception as e:
-            logger.error(f"Error loading channel settings: {e}")
+            # Fetch just the setting columns as a plain Row, no ORM object materialization
+            row = session.execute(_STMT_GET_CHANNEL_SETTINGS, {"cid": channel_id}).first()
+        except Exception:
+            session.rollback()
+            raise
         finally:
+            # End the read transaction and return the connection to the pool
             session.close()
+        return row._asdict() if row else None
+
+    def _write_channel_setting(self, channel_id: str, key: str, value):
+        """Persist a single channel setting, creating the row if needed."""
+        if self._sqlite_conn is not None:
+            now = datetime.utcnow().isoformat(sep=' ')
+            with self._sqlite_lock:
+                self._sqlite_conn.execute(_UPSERT_CHANNEL_SQL[key], (channel_id, value, now, now))
+            return
 
-    def save_channel_setting(self, channel_id: str, key: str, value):
-        """Save a channel setting to database and memory cache."""
         session = self.db_session()
         try:
-            # Get or create channel settings record
-            channel_setting = session.query(ChannelSettings).filter_by(channel_id=channel_id).first()
-            if not channel_setting:
-                channel_setting = ChannelSettings(channel_id=channel_id)
-                session.add(channel_setting)
-
-            # Update the setting
-            setattr(channel_setting, key, value)
+            insert = _UPSERT_DIALECTS.get(self.db_engine.dialect.name)
+            if insert is not None:
+                # Single round-trip upsert instead of SELECT followed by INSERT/UPDATE
+                now = datetime.utcnow()
+                values = {'channel_id': channel_id, 'provider': 'ollama', key: value,
+                          'created_at': now, 'updated_at': now}
+                stmt = insert(ChannelSettings).values(**values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[ChannelSettings.channel_id],
+                    set_={key: stmt.excluded[key], 'updated_at': stmt.excluded.updated_at}
+                )
+                session.execute(stmt)
+            else:
+                # Get or create channel settings record
+                channel_setting = session.execute(
+                    _STMT_GET_CHANNEL_ROW, {"cid": channel_id}
+                ).scalar_one_or_none()
+                if not channel_setting:
+                    channel_setting = ChannelSettings(channel_id=channel_id)
+                    session.add(channel_setting)
+
+                # Update the setting
+                setattr(channel_setting, key, value)
             session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            # Return the connection to the pool, as the read path does
+            session.close()
+
+    def _get_cached_settings(self, channel_id: str) -> dict:
+        """Return the cached settings for a channel, loading them from the database on a miss."""
+        cache = self.channel_settings_cache
+        settings = cache.get(channel_id)
+        if settings is not None:
+            cache.move_to_end(channel_id)
+            return settings
 
-            # Update in-memory cache
-            if channel_id not in self.channel_settings_cache:
-                self.channel_settings_cache[channel_id] = {}
-            self.channel_settings_cache[channel_id][key] = value
+        try:
+            settings = self._fetch_channel_settings(channel_id) or {}
+        except Exception as e:
+            logger.error(f"Error loading channel settings for {channel_id}: {e}")
+            return {}
+
+        # Cache misses too, so unconfigured channels don't hit the database every call
+        cache[channel_id] = settings
+        if len(cache) > self._cache_max:
+            cache.popitem(last=False)
+        return settings
+
+    def save_channel_setting(self, channel_id: str, key: str, value):
+        """Save a channel setting to database and memory cache."""
+        if key not in CHANNEL_SETTING_KEYS:
+            logger.error(f"Unknown channel setting: {key}")
+            return
+
+        # Nothing to write if the cached value is already current
+        cached = self._get_cached_settings(channel_id)
+        if cached.get(key, _MISSING) == value:
+            return
+
+        try:
+            self._write_channel_setting(channel_id, key, value)
+
+            # Update in-memory cache; a channel without a row just got one holding the defaults
+            if not cached:
+                cached.update(_NEW_ROW_SETTINGS)
+            cached[key] = value
 
             logger.debug(f"Saved channel setting {channel_id}.{key} = {value}")
 
         except Exception as e:
             logger.error(f"Error saving channel setting: {e}")
-            session.rollback()
-        finally:
-            session.close()
+
+    async def save_channel_setting_async(self, channel_id: str, key: str, value):
+        """Save a channel setting without blocking the event loop on the database write."""
+        cached = self.channel_settings_cache.get(channel_id)
+        if cached is not None and cached.get(key, _MISSING) == value:
+            return
+        await asyncio.to_thread(self.save_channel_setting, channel_id, key, value)
 
     def get_channel_setting(self, channel_id: str, key: str, default=None):
         """Get a channel setting from cache, falling back to global default if not set."""
-        channel_settings = self.channel_settings_cache.get(channel_id, {})
+        channel_settings = self._get_cached_settings(channel_id)
 
         # If channel has the setting, return it
         if key in channel_settings and channel_settings[key] is not None:
             return channel_settings[key]
-        
-        return default
\ No newline at end of file
+
+        return default
+
+    def close(self):
+        """Release the thread-local session and dispose of the connection pool."""
+        if self._sqlite_conn is not None:
+            self._sqlite_conn.close()
+            self._sqlite_conn = None
+        if self.db_session is not None:
+            self.db_session.remove()
+        if self.db_engine is not None:
+            self.db_engine.dispose()
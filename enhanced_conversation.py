@@ -3,20 +3,37 @@
 import logging
 import json
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+import heapq
+from typing import List, Dict, Any, Deque, Optional, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from collections import Counter, defaultdict, deque
+from itertools import count, islice
 import re
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Memory retention ranking; unknown importance levels rank as 'medium'
+_IMPORTANCE_RANK = {'high': 3, 'medium': 2, 'low': 1}
+MAX_MEMORY_ITEMS = 20
+# Number of most recent messages the context summary describes
+SUMMARY_WINDOW = 5
+
+# Tie-breaker so heap entries never fall through to comparing item dicts
+_memory_seq = count()
+
+@dataclass(slots=True)
 class ConversationContext:
     """Enhanced conversation context with metadata"""
     user_id: int
     conversation_id: str
-    messages: List[Dict[str, Any]]
+    messages: Deque[Dict[str, Any]]  # Bounded; oldest messages fall off the left
     topics: List[str]
     entities: List[str]
     sentiment: str
@@ -24,16 +41,86 @@ class ConversationContext:
     context_summary: str
     preferences: Dict[str, Any]
     memory_items: List[Dict[str, Any]]
+    # Counts behind context_summary over the last SUMMARY_WINDOW messages, updated per message
+    question_count: int = 0
+    response_count: int = 0
+    # Derived indexes, rebuilt in __post_init__ (declared so they get slots)
+    _topic_set: set = field(init=False, repr=False, compare=False)
+    _entity_set: set = field(init=False, repr=False, compare=False)
+    _mem_heap: list = field(init=False, repr=False, compare=False)
+    _summary_window: deque = field(init=False, repr=False, compare=False)
+    _window_topics: Counter = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Membership sets mirroring topics/entities for O(1) dedup (not serialized)
+        self._topic_set = set(self.topics)
+        self._entity_set = set(self.entities)
+        # Min-heap of (rank, timestamp, seq, item) so the least important, oldest memory pops first
+        self._mem_heap = [self._memory_entry(item) for item in self.memory_items]
+        heapq.heapify(self._mem_heap)
+        # Rolling summary state: (topics, is question, is response) per windowed message.
+        # The window never outlives the messages it describes, even with a short history.
+        window_size = min(SUMMARY_WINDOW, self.messages.maxlen or SUMMARY_WINDOW)
+        self._summary_window = deque(maxlen=window_size)
+        self._window_topics = Counter()
+        self.question_count = self.response_count = 0
+        for message in islice(self.messages, max(len(self.messages) - window_size, 0), None):
+            self.track_summary(message)
+
+    def track_summary(self, message: Dict[str, Any]) -> None:
+        """Add a message to the summary window, retiring the oldest one when it is full"""
+        analysis = message.get('analysis') or {}
+        role = message.get('role')
+        entry = (tuple(analysis.get('topics', ())),
+                 role == 'user' and bool(analysis.get('question_type')),
+                 role == 'assistant')
+
+        window = self._summary_window
+        topic_counts = self._window_topics
+        if len(window) == window.maxlen:
+            old_topics, old_question, old_response = window[0]  # Dropped by the append below
+            for topic in old_topics:
+                topic_counts[topic] -= 1
+                if not topic_counts[topic]:
+                    del topic_counts[topic]
+            self.question_count -= old_question
+            self.response_count -= old_response
+
+        window.append(entry)
+        topic_counts.update(entry[0])
+        self.question_count += entry[1]
+        self.response_count += entry[2]
+
+    @property
+    def recent_topics(self) -> List[str]:
+        """Topics of the windowed messages, in order of first appearance"""
+        return list(self._window_topics)
+
+    @staticmethod
+    def _memory_entry(item: Dict[str, Any]) -> Tuple[int, Any, int, Dict[str, Any]]:
+        return (_IMPORTANCE_RANK.get(item.get('importance'), 2), item['timestamp'], next(_memory_seq), item)
 
     def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for storage"""
-        data = asdict(self)
-        data['last_activity'] = self.last_activity.isoformat()
-        return data
+        """Convert to dictionary for storage (shallow: nested lists/dicts are shared, not copied)"""
+        return {
+            'user_id': self.user_id,
+            'conversation_id': self.conversation_id,
+            'messages': list(self.messages),
+            'topics': self.topics,
+            'entities': self.entities,
+            'sentiment': self.sentiment,
+            'last_activity': self.last_activity.isoformat(),
+            'context_summary': self.context_summary,
+            'preferences': self.preferences,
+            'memory_items': self.memory_items,
+            'question_count': self.question_count,
+            'response_count': self.response_count,
+        }
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'ConversationContext':
+    def from_dict(cls, data: Dict[str, Any], max_messages: Optional[int] = None) -> 'ConversationContext':
         """Create from dictionary"""
+        data['messages'] = deque(data['messages'], maxlen=max_messages)
         data['last_activity'] = datetime.fromisoformat(data['last_activity'])
         return cls(**data)
 
@@ -52,14 +139,43 @@ class ContextAnalyzer:
             'personal': ['feel', 'emotion', 'relationship', 'friend', 'family', 'life']
         }
 
-        # Entity patterns
+        # Entity patterns; alternation order matters in the fused regex below, so the more
+        # specific shapes come first (emails before urls, dates/times before bare numbers)
         self.entity_patterns = {
-            'urls': r'https?://[^\s]+',
-            'emails': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            'dates': r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b',
-            'times': r'\b\d{1,2}:\d{2}(?:\s?[ap]m)?\b',
-            'numbers': r'\b\d+(?:\.\d+)?\b'
+            'emails': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+            'urls': re.compile(r'https?://[^\s]+'),
+            'dates': re.compile(r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b'),
+            'times': re.compile(r'\b\d{1,2}:\d{2}(?:\s?[ap]m)?\b'),
+            'numbers': re.compile(r'\b\d+(?:\.\d+)?\b')
         }
+        # All entity patterns fused into one scan, dispatched on the named group that matched
+        self.entity_re = re.compile(
+            "|".join(f"(?P<{name}>{pattern.pattern})" for name, pattern in self.entity_patterns.items())
+        )
+
+        # Leading interrogative word marks a factual question
+        self.question_prefix = re.compile(r'^(what|how|why|when|where|who|which)\b', re.IGNORECASE)
+
+        # Sentiment keywords, matched against whole word tokens
+        self._pos_set = frozenset(['good', 'great', 'excellent', 'amazing', 'love', 'happy', 'awesome'])
+        self._neg_set = frozenset(['bad', 'terrible', 'hate', 'sad', 'angry', 'awful', 'horrible'])
+        self._word_re = re.compile(r'\w+')
+
+        # Aho-Corasick automaton finding every topic keyword in one pass
+        self.kw_automaton = self._build_keyword_automaton() if AHOCORASICK_AVAILABLE else None
+
+    def _build_keyword_automaton(self):
+        """Build an automaton mapping each topic keyword to the topics that list it"""
+        hits: Dict[str, List[str]] = defaultdict(list)
+        for topic, keywords in self.topic_keywords.items():
+            for keyword in keywords:
+                hits[keyword].append(topic)
+
+        automaton = ahocorasick.Automaton()
+        for keyword, topics in hits.items():
+            automaton.add_word(keyword, topics)
+        automaton.make_automaton()
+        return automaton
 
     def analyze_message(self, message: str) -> Dict[str, Any]:
         """Analyze a single message for context"""
@@ -73,22 +189,29 @@ class ContextAnalyzer:
 
         # Extract topics
         message_lower = message.lower()
-        for topic, keywords in self.topic_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                analysis['topics'].append(topic)
-
-        # Extract entities
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = re.findall(pattern, message)
-            if matches:
-                analysis['entities'].extend([f"{entity_type}:{match}" for match in matches[:3]])  # Limit to 3
-
-        # Basic sentiment analysis
-        positive_words = ['good', 'great', 'excellent', 'amazing', 'love', 'happy', 'awesome']
-        negative_words = ['bad', 'terrible', 'hate', 'sad', 'angry', 'awful', 'horrible']
-
-        pos_count = sum(1 for word in positive_words if word in message_lower)
-        neg_count = sum(1 for word in negative_words if word in message_lower)
+        analysis['topics'] = self._match_topics(message_lower)
+
+        # Extract entities in a single pass, keeping at most 3 per type
+        found: Dict[str, List[str]] = {}
+        unfilled = len(self.entity_patterns)
+        for match in self.entity_re.finditer(message):
+            matches = found.setdefault(match.lastgroup, [])
+            if len(matches) < 3:
+                matches.append(match.group())
+                if len(matches) == 3:
+                    unfilled -= 1
+                    if not unfilled:
+                        break  # Every type is capped; skip the rest of a long message
+        for entity_type in self.entity_patterns:
+            analysis['entities'].extend(f"{entity_type}:{match}" for match in found.get(entity_type, ()))
+
+        # Basic sentiment analysis over word tokens
+        pos_count = neg_count = 0
+        for token in self._word_re.findall(message_lower):
+            if token in self._pos_set:
+                pos_count += 1
+            elif token in self._neg_set:
+                neg_count += 1
 
         if pos_count > neg_count:
             analysis['sentiment'] = 'positive'
@@ -96,49 +219,42 @@ class ContextAnalyzer:
             analysis['sentiment'] = 'negative'
 
         # Detect question types
-        if message.startswith(('what', 'how', 'why', 'when', 'where', 'who', 'which')):
-            analysis['question_type'] = 'factual'
-        elif any(word in message_lower for word in ['explain', 'describe', 'tell me about']):
-            analysis['question_type'] = 'explanatory'
-        elif any(word in message_lower for word in ['help', 'assist', 'can you']):
-            analysis['question_type'] = 'assistance'
+        analysis['question_type'] = self._question_type(message, message_lower)
 
         return analysis
 
-    def generate_context_summary(self, messages: List[Dict[str, Any]]) -> str:
-        """Generate a summary of the conversation context"""
-        if not messages:
-            return "New conversation"
-
-        # Get last 5 messages for summary
-        recent_messages = messages[-5:]
-
-        # Extract key topics and themes
-        all_topics = set()
-        user_questions = []
-        assistant_responses = []
-
-        for msg in recent_messages:
-            analysis = self.analyze_message(msg.get('content', ''))
-
-            all_topics.update(analysis.get('topics', []))
-            if msg.get('role') == 'user':
-                if analysis.get('question_type'):
-                    user_questions.append(msg.get('content', '')[:100])
-            elif msg.get('role') == 'assistant':
-                assistant_responses.append(msg.get('content', '')[:100])
-
-        # Generate summary
+    def _match_topics(self, text_lower: str) -> List[str]:
+        """Return the topics whose keywords occur in already-lowercased text, in declared order"""
+        if self.kw_automaton is not None:
+            topics = set()
+            for _, keyword_topics in self.kw_automaton.iter(text_lower):
+                topics.update(keyword_topics)
+            return [topic for topic in self.topic_keywords if topic in topics]
+        return [topic for topic, keywords in self.topic_keywords.items()
+                if any(keyword in text_lower for keyword in keywords)]
+
+    def _question_type(self, message: str, message_lower: str) -> Optional[str]:
+        """Classify a message as a factual, explanatory or assistance question, if any"""
+        if self.question_prefix.match(message):
+            return 'factual'
+        if any(word in message_lower for word in ['explain', 'describe', 'tell me about']):
+            return 'explanatory'
+        if any(word in message_lower for word in ['help', 'assist', 'can you']):
+            return 'assistance'
+        return None
+
+    def format_summary(self, topics: List[str], question_count: int, response_count: int) -> str:
+        """Render a context summary line from topic and message counts"""
         summary_parts = []
 
-        if all_topics:
-            summary_parts.append(f"Topics: {', '.join(list(all_topics)[:3])}")
+        if topics:
+            summary_parts.append(f"Topics: {', '.join(topics[:3])}")
 
-        if user_questions:
-            summary_parts.append(f"Recent questions: {len(user_questions)}")
+        if question_count:
+            summary_parts.append(f"Recent questions: {question_count}")
 
-        if assistant_responses:
-            summary_parts.append(f"Assistant responses: {len(assistant_responses)}")
+        if response_count:
+            summary_parts.append(f"Assistant responses: {response_count}")
 
         return " | ".join(summary_parts) if summary_parts else "General conversation"
 
@@ -153,6 +269,8 @@ class EnhancedConversationManager:
         # In-memory storage (would be replaced with database in production)
         self.conversations: Dict[int, List[ConversationContext]] = defaultdict(list)
         self.user_preferences: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        # Most recently active conversation per user, kept current instead of scanning for it
+        self._current: Dict[int, ConversationContext] = {}
 
         logger.info("Enhanced ConversationManager initialized")
 
@@ -170,20 +288,19 @@ class EnhancedConversationManager:
             'role': role,
             'type': message_type,
             'timestamp': datetime.now(),
-            'analysis': self.context_analyzer.analyze_message(content)
+            'analysis': self.context_analyzer.analyze_message(content),
+            # Word estimate for "Role: content", counted once instead of split() per get_context
+            '_tok_estimate': content.count(' ') + 2
         }
 
-        # Add to conversation
+        # Add to conversation (the bounded deque drops the oldest message when full)
         conversation.messages.append(message)
         conversation.last_activity = datetime.now()
+        self._current[user_id] = conversation
 
         # Update conversation metadata
         self._update_conversation_metadata(conversation, message)
 
-        # Trim old messages if needed
-        if len(conversation.messages) > self.max_messages_per_conversation:
-            conversation.messages = conversation.messages[-self.max_messages_per_conversation:]
-
         # Clean up old conversations
         self._cleanup_old_conversations(user_id)
 
@@ -196,37 +313,41 @@ class EnhancedConversationManager:
         if not conversation or not conversation.messages:
             return system_prompt
 
-        # Build context from recent messages
-        context_parts = []
+        # Build context: header (system prompt, preferences), recent messages, then summary
+        header_parts = []
         if system_prompt:
-            context_parts.append(f"System: {system_prompt}")
-
-        # Add conversation summary
-        if conversation.context_summary:
-            context_parts.append(f"Context: {conversation.context_summary}")
+            header_parts.append(f"System: {system_prompt}")
 
         # Add user preferences
         preferences = self.user_preferences.get(user_id, {})
         if preferences:
             pref_text = ", ".join([f"{k}: {v}" for k, v in preferences.items() if v])
             if pref_text:
-                context_parts.append(f"User preferences: {pref_text}")
+                header_parts.append(f"User preferences: {pref_text}")
 
-        # Add recent messages (within token limit)
-        total_tokens = sum(len(part.split()) for part in context_parts)
+        # Render the conversation summary from its rolling window counts
+        conversation.context_summary = self.context_analyzer.format_summary(
+            conversation.recent_topics, conversation.question_count, conversation.response_count
+        )
+        summary_parts = [f"Context: {conversation.context_summary}"] if conversation.context_summary else []
 
-        for message in reversed(conversation.messages):
-            msg_text = f"{message['role'].title()}: {message['content']}"
+        # Add recent messages (within token limit), newest first, then restore chronological order
+        total_tokens = sum(len(part.split()) for part in header_parts + summary_parts)
+        msg_buf = []
 
+        for message in reversed(conversation.messages):
             # Estimate tokens (rough approximation)
-            msg_tokens = len(msg_text.split())
+            msg_tokens = message.get('_tok_estimate')
+            if msg_tokens is None:
+                msg_tokens = len(message['content'].split()) + 1
             if total_tokens + msg_tokens > max_tokens:
                 break
 
-            context_parts.insert(-1, msg_text)  # Insert before context summary
+            msg_buf.append(f"{message['role'].title()}: {message['content']}")
             total_tokens += msg_tokens
 
-        return "\n\n".join(context_parts)
+        msg_buf.reverse()
+        return "\n\n".join(header_parts + msg_buf + summary_parts)
 
     async def get_memory_items(self, user_id: int, topic: str = None) -> List[Dict[str, Any]]:
         """Retrieve relevant memory items for context"""
@@ -260,14 +381,12 @@ class EnhancedConversationManager:
         }
 
         conversation.memory_items.append(memory_item)
+        heapq.heappush(conversation._mem_heap, conversation._memory_entry(memory_item))
 
-        # Keep only most important/recent memories
-        conversation.memory_items.sort(key=lambda x: (
-            {'high': 3, 'medium': 2, 'low': 1}[x['importance']],
-            x['timestamp']
-        ), reverse=True)
-
-        conversation.memory_items = conversation.memory_items[:20]  # Max 20 memories
+        # Keep only the most important/recent memories
+        if len(conversation._mem_heap) > MAX_MEMORY_ITEMS:
+            evicted = heapq.heappop(conversation._mem_heap)[-1]
+            conversation.memory_items = [item for item in conversation.memory_items if item is not evicted]
 
         logger.info(f"Added memory item to user {user_id}")
 
@@ -292,12 +411,7 @@ class EnhancedConversationManager:
 
     def _get_current_conversation(self, user_id: int) -> Optional[ConversationContext]:
         """Get the user's current active conversation"""
-        conversations = self.conversations.get(user_id, [])
-        if not conversations:
-            return None
-
-        # Return most recently active conversation
-        return max(conversations, key=lambda c: c.last_activity)
+        return self._current.get(user_id)
 
     def _create_new_conversation(self, user_id: int) -> ConversationContext:
         """Create a new conversation for the user"""
@@ -306,7 +420,7 @@ class EnhancedConversationManager:
         conversation = ConversationContext(
             user_id=user_id,
             conversation_id=conversation_id,
-            messages=[],
+            messages=deque(maxlen=self.max_messages_per_conversation),
             topics=[],
             entities=[],
             sentiment='neutral',
@@ -317,6 +431,7 @@ class EnhancedConversationManager:
         )
 
         self.conversations[user_id].append(conversation)
+        self._current[user_id] = conversation
 
         # Clean up old conversations
         self._cleanup_old_conversations(user_id)
@@ -330,26 +445,29 @@ class EnhancedConversationManager:
 
         # Update topics
         new_topics = analysis.get('topics', [])
+        topic_set = conversation._topic_set
         for topic in new_topics:
-            if topic not in conversation.topics:
+            if topic not in topic_set:
+                topic_set.add(topic)
                 conversation.topics.append(topic)
 
         # Update entities
         new_entities = analysis.get('entities', [])
+        entity_set = conversation._entity_set
         for entity in new_entities:
-            if entity not in conversation.entities:
+            if entity not in entity_set:
+                entity_set.add(entity)
                 conversation.entities.append(entity)
 
         # Update sentiment (simple majority)
+        messages = conversation.messages
         sentiments = [msg.get('analysis', {}).get('sentiment', 'neutral')
-                     for msg in conversation.messages[-10:]]  # Last 10 messages
+                     for msg in islice(messages, max(len(messages) - 10, 0), None)]  # Last 10 messages
         if sentiments:
-            conversation.sentiment = max(set(sentiments), key=sentiments.count)
+            conversation.sentiment = Counter(sentiments).most_common(1)[0][0]
 
-        # Update context summary
-        conversation.context_summary = self.context_analyzer.generate_context_summary(
-            conversation.messages
-        )
+        # Update summary window counts; the summary itself is rendered in get_context
+        conversation.track_summary(message)
 
     def _cleanup_old_conversations(self, user_id: int) -> None:
         """Clean up old/inactive conversations"""
@@ -365,6 +483,14 @@ class EnhancedConversationManager:
             conversations.sort(key=lambda c: c.last_activity, reverse=True)
             conversations[:] = conversations[:self.max_conversations_per_user]
 
+        # Repoint the current conversation if it was just evicted
+        current = self._current.get(user_id)
+        if current is not None and not any(c is current for c in conversations):
+            if conversations:
+                self._current[user_id] = max(conversations, key=lambda c: c.last_activity)
+            else:
+                del self._current[user_id]
+
 # Global instance
 enhanced_conversation_manager = EnhancedConversationManager()
 
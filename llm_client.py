@@ -1,14 +1,223 @@
 """Multi-provider LLM client for AI model interactions"""
 
 import asyncio
+import hashlib
 import logging
+import random
+import re
+import time
+import weakref
 import aiohttp
 import json
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Awaitable, Callable, Optional, Dict, Any, Tuple
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
 
 logger = logging.getLogger(__name__)
 
+_JSON_CONTENT_TYPE = {"Content-Type": "application/json"}
+
+# Marker preceding each tool call in a model response; the JSON object after it is decoded separately
+_TOOL_CALL_RE = re.compile(r'TOOL_CALL:\s*')
+_JSON_DECODER = json.JSONDecoder()
+
+# Transient HTTP statuses worth retrying (rate limiting and server-side failures)
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_RETRY_AFTER = 60.0
+
+# Temperature assumed (and sent by most providers) when a call doesn't set one
+DEFAULT_TEMPERATURE = 0.7
+
+
+@dataclass(slots=True, frozen=True)
+class GenerateParams:
+    """Sampling options of a generate call; None means the provider's own default"""
+    max_tokens: Optional[int] = None
+    temperature: float = DEFAULT_TEMPERATURE
+    top_p: Optional[float] = None
+    top_k: Optional[int] = None
+    repetition_penalty: Optional[float] = None
+    system: Optional[str] = None
+
+    @classmethod
+    def from_kwargs(cls, kwargs: Dict[str, Any]) -> "GenerateParams":
+        return cls(**{name: kwargs[name] for name in _GENERATE_PARAM_NAMES if name in kwargs})
+
+
+_GENERATE_PARAM_NAMES = tuple(f.name for f in fields(GenerateParams))
+
+# Exact-match cache of generated responses, shared across LLMClient instances.
+# Only near-deterministic requests (temperature <= RESPONSE_CACHE_MAX_TEMPERATURE) are cached,
+# so sampled replies keep their variety.
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_MAX_TEMPERATURE = 0.2
+_response_cache: "OrderedDict[tuple, str]" = OrderedDict()
+# How long Ollama keeps a model loaded after a request (Ollama's own default is 5m)
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Provider calls currently running for a cacheable request; duplicates await the same future
+_inflight: Dict[tuple, "asyncio.Future[Any]"] = {}
+# Result handed to duplicates when the call they waited on was cancelled
+_OWNER_CANCELLED = object()
+
+# Model lists change rarely; cache successful lookups per (provider class, endpoint, API key digest)
+MODELS_CACHE_TTL = 300.0
+_models_cache: Dict[Tuple[str, str, bytes], Tuple[float, list[str]]] = {}
+
+# Model id prefixes kept when listing OpenAI models (ids are lowercase)
+_OPENAI_CHAT_PREFIXES = ("gpt-", "chatgpt-", "ft:gpt-", "o1", "o3", "o4")
+
+# Hugging Face response-shape extractors, remembered per model id once detected
+def _hf_generated_text(result: Any) -> str:
+    return result[0]["generated_text"]
+
+
+def _hf_conversation_reply(result: Any) -> str:
+    return result[0]["conversation"]["generated_responses"][-1]
+
+
+_hf_extractors: Dict[str, Callable[[Any], str]] = {}
+
+# Providers without a usable models endpoint advertise these fixed catalogues
+_HUGGINGFACE_MODELS = (
+    "microsoft/DialoGPT-medium",
+    "facebook/blenderbot-400M-distill",
+    "google/flan-t5-base",
+    "microsoft/DialoGPT-large"
+)
+_ANTHROPIC_MODELS = (
+    "claude-3-opus-20240229",
+    "claude-3-sonnet-20240229",
+    "claude-3-haiku-20240307",
+    "claude-2.1",
+    "claude-instant-1.2"
+)
+
+# One keep-alive HTTP session per event loop, shared by every provider instance.
+# LLMClient objects are often created per request, so a per-instance session would
+# never get reused (or closed); keying by loop keeps the Discord thread's loop separate.
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+# Connection pool bounds for the shared session (total, and per provider host)
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_CONNECTIONS_PER_HOST = 20
+# Chat traffic is bursty; keep idle provider connections (and DNS answers) around longer
+# than aiohttp's 15s/10s defaults so the next message skips the TCP/TLS handshake
+HTTP_KEEPALIVE_TIMEOUT = 75.0
+HTTP_DNS_CACHE_TTL = 300
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session for the running event loop, creating it if needed"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_MAX_CONNECTIONS,
+            limit_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[loop] = session
+    return session
+
+
+async def close_http_session() -> None:
+    """Close the shared aiohttp session for the running event loop"""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def _single_flight(key: tuple, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Run coro_factory(), unless a call with the same key is already running on this loop
+
+    Duplicates await the running call's result instead of starting their own.
+    If the running call is cancelled, its duplicates retry and one becomes the new owner.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        pending = _inflight.get(key)
+        if pending is None or pending.get_loop() is not loop:
+            break
+        # Shield so a cancelled duplicate doesn't cancel the call it is waiting on
+        result = await asyncio.shield(pending)
+        if result is not _OWNER_CANCELLED:
+            return result
+
+    future = _inflight[key] = loop.create_future()
+    try:
+        result = await coro_factory()
+    except asyncio.CancelledError:
+        # Only the owner was cancelled; wake duplicates so they retry rather than fail
+        future.set_result(_OWNER_CANCELLED)
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # Mark retrieved when no duplicate was waiting
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+    future.set_result(result)
+    return result
+
+
+def _retry_after_seconds(headers) -> Optional[float]:
+    """Parse a numeric Retry-After header, if present"""
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return min(max(float(value), 0.0), _MAX_RETRY_AFTER) if value is not None else None
+    except ValueError:
+        return None
+
+
+async def _retry_call(coro_factory: Callable[[], Awaitable[Any]], retries: int = 3,
+                      base: float = 0.25, cap: float = 8.0) -> Any:
+    """Await coro_factory(), retrying transient failures with exponential backoff and jitter
+
+    Timeouts, connection errors, 429 and 5xx responses are retried; a numeric Retry-After
+    header is honoured. Anything else, or the last failed attempt, is re-raised.
+    """
+    for attempt in range(retries):
+        try:
+            return await coro_factory()
+        except aiohttp.ClientResponseError as e:
+            if e.status not in _RETRY_STATUSES or attempt == retries - 1:
+                raise
+            delay = _retry_after_seconds(e.headers)
+            reason = f"HTTP {e.status}"
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            if attempt == retries - 1:
+                raise
+            delay = None
+            reason = type(e).__name__
+        if delay is None:
+            delay = min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+        logger.warning(f"{reason} (attempt {attempt + 1}/{retries}), retrying in {delay:.2f}s...")
+        await asyncio.sleep(delay)
+
+
+def _decode_json(body: bytes) -> Any:
+    """Decode a JSON response body, surfacing bad payloads as aiohttp client errors"""
+    try:
+        return _json_loads(body)
+    except ValueError as e:
+        raise aiohttp.ClientPayloadError(f"Invalid JSON response: {e}") from e
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
@@ -16,6 +225,111 @@ class LLMProvider(ABC):
     def __init__(self, timeout: int = 30):
         self.timeout = timeout
 
+    @property
+    def timeout(self) -> int:
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value: int) -> None:
+        # aiohttp wants a ClientTimeout; build it once rather than per request
+        self._timeout = value
+        self._client_timeout = aiohttp.ClientTimeout(total=value)
+
+    async def _post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                         retries: int = 3) -> Any:
+        """POST a JSON payload on the shared session and return the decoded response
+
+        Transient failures (timeouts, dropped connections, 429/5xx) are retried with backoff.
+        """
+        if not headers:
+            headers = _JSON_CONTENT_TYPE
+        elif "Content-Type" not in headers:
+            headers = {**headers, **_JSON_CONTENT_TYPE}
+        body = _json_dumps(payload)
+
+        async def attempt() -> Any:
+            async with get_http_session().post(url, headers=headers, data=body, timeout=self._client_timeout) as response:
+                response.raise_for_status()
+                return _decode_json(await response.read())
+
+        return await _retry_call(attempt, retries)
+
+    async def _get_json(self, url: str, headers: Optional[Dict[str, str]] = None, retries: int = 3) -> Any:
+        """GET a URL on the shared session and return the decoded response, retrying transient failures"""
+        async def attempt() -> Any:
+            async with get_http_session().get(url, headers=headers, timeout=self._client_timeout) as response:
+                response.raise_for_status()
+                return _decode_json(await response.read())
+
+        return await _retry_call(attempt, retries)
+
+    async def _stream_sse(self, url: str, payload: Dict[str, Any],
+                          headers: Dict[str, str]) -> AsyncIterator[Dict[str, Any]]:
+        """POST a streaming request and yield each server-sent event's decoded JSON data"""
+        async with get_http_session().post(url, headers=headers, data=_json_dumps(payload),
+                                           timeout=self._client_timeout) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                if data:
+                    yield _decode_json(data)
+
+    def _chat_payload(self, prompt: str, model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": kwargs.get('max_tokens', 1000),
+            "temperature": kwargs.get('temperature', DEFAULT_TEMPERATURE)
+        }
+
+    async def _chat_completion(self, prompt: str, model: str, **kwargs) -> str:
+        """Call an OpenAI-compatible /chat/completions endpoint (self._generate_url)"""
+        data = self._chat_payload(prompt, model, kwargs)
+        result = await self._post_json(self._generate_url, data, self._headers)
+        return result["choices"][0]["message"]["content"]
+
+    async def _chat_completion_stream(self, prompt: str, model: str, **kwargs) -> AsyncIterator[str]:
+        """Stream an OpenAI-compatible chat completion, yielding content deltas"""
+        data = self._chat_payload(prompt, model, kwargs)
+        data["stream"] = True
+        async for event in self._stream_sse(self._generate_url, data, self._headers):
+            choices = event.get("choices")
+            text = choices and choices[0].get("delta", {}).get("content")
+            if text:
+                yield text
+
+    def _models_cache_key(self) -> Tuple[str, str, bytes]:
+        # Keyed on the API key too: accounts see different models (e.g. their own fine-tunes)
+        api_key = getattr(self, 'api_key', None) or ''
+        return (
+            type(self).__name__,
+            getattr(self, 'base_url', None) or getattr(self, 'host', ''),
+            hashlib.blake2b(api_key.encode(), digest_size=16).digest(),
+        )
+
+    def _get_cached_models(self) -> Optional[list[str]]:
+        """Return the cached model list if it is still fresh"""
+        entry = _models_cache.get(self._models_cache_key())
+        if entry and time.monotonic() - entry[0] < MODELS_CACHE_TTL:
+            return list(entry[1])
+        return None
+
+    def _set_cached_models(self, models: list[str]) -> list[str]:
+        """Cache a freshly fetched model list and return it"""
+        _models_cache[self._models_cache_key()] = (time.monotonic(), list(models))
+        return models
+
+    async def close(self) -> None:
+        """Release HTTP resources held by this provider
+
+        Providers hold none of their own: the per-loop session is shared with every other
+        client, so only its owner closes it, through close_http_session().
+        """
+
     @abstractmethod
     async def generate(self, prompt: str, **kwargs) -> str:
         """Generate response"""
@@ -30,54 +344,75 @@ class LLMProvider(ABC):
 class OllamaProvider(LLMProvider):
     """Ollama provider"""
 
-    def __init__(self, host: str, timeout: int = 30):
+    def __init__(self, host: str = "http://localhost:11434", timeout: int = 30):
         super().__init__(timeout)
+        logger.info(f"Creating Ollama provider with host: {host}")
         self.host = host.rstrip("/")
+        self._generate_url = f"{self.host}/api/generate"
+        self._tags_url = f"{self.host}/api/tags"
 
     async def generate(self, prompt: str, model: str = "llama2", **kwargs) -> str:
         """Generate response with Ollama"""
         retries = kwargs.get('retries', 3)
-        for attempt in range(retries):
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        f"{self.host}/api/generate",
-                        json={
-                            "model": model,
-                            "prompt": prompt,
-                            "stream": False,
-                        },
-                        timeout=self.timeout,
-                    ) as response:
-                        response.raise_for_status()
-                        data = await response.json()
-                        return data.get("response", "No response returned.")
-            except asyncio.TimeoutError:
-                if attempt < retries - 1:
-                    logger.warning(f"Ollama timeout (attempt {attempt + 1}/{retries}), retrying...")
-                    await asyncio.sleep(1)
-                    continue
-                else:
-                    logger.error(f"Ollama timeout after {retries} attempts")
-                    return "❌ AI service timeout. Please try again later."
-            except aiohttp.ClientError as e:
-                logger.error(f"Ollama generate error: {e}")
-                return f"❌ Error communicating with the AI service: {e}"
 
-        return "❌ Unexpected error occurred."
+        async def attempt() -> str:
+            parts = [chunk async for chunk in self.generate_stream(prompt, model=model, **kwargs)]
+            return "".join(parts) or "No response returned."
+
+        try:
+            return await _retry_call(attempt, retries)
+        except asyncio.TimeoutError:
+            logger.error(f"Ollama timeout after {retries} attempts")
+            return "❌ AI service timeout. Please try again later."
+        except aiohttp.ClientError as e:
+            logger.error(f"Ollama generate error: {e}")
+            return f"❌ Error communicating with the AI service: {e}"
+
+    async def generate_stream(self, prompt: str, model: str = "llama2", **kwargs) -> AsyncIterator[str]:
+        """Yield response text from Ollama as it is generated (newline-delimited JSON)
+
+        Optional kwargs: ``system`` (sent separately from the prompt), ``context``
+        (token list returned by a previous call) and ``keep_alive`` (how long the
+        model stays loaded, default OLLAMA_KEEP_ALIVE).
+        """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            # Keep the model, and its cached prompt prefix, resident between chat turns
+            "keep_alive": kwargs.get('keep_alive', OLLAMA_KEEP_ALIVE),
+        }
+        for option in ('system', 'context'):
+            if kwargs.get(option):
+                payload[option] = kwargs[option]
+        async with get_http_session().post(
+            self._generate_url,
+            headers=_JSON_CONTENT_TYPE,
+            data=_json_dumps(payload),
+            timeout=self._client_timeout,
+        ) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                chunk = _decode_json(line)
+                if chunk.get("error"):
+                    raise aiohttp.ClientPayloadError(f"Ollama error: {chunk['error']}")
+                text = chunk.get("response")
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    break
 
     async def list_models(self) -> list[str]:
         """List available Ollama models"""
+        cached = self._get_cached_models()
+        if cached is not None:
+            return cached
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.host}/api/tags",
-                    timeout=self.timeout,
-                ) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    return [m["name"] for m in data.get("models", [])]
-        except aiohttp.ClientError as e:
+            data = await self._get_json(self._tags_url)
+            return self._set_cached_models([m["name"] for m in data.get("models", [])])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Ollama list models error: {e}")
             return []
 
@@ -89,49 +424,33 @@ class OpenAIProvider(LLMProvider):
         super().__init__(timeout)
         self.api_key = api_key
         self.base_url = "https://api.openai.com/v1"
+        self._headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self._generate_url = f"{self.base_url}/chat/completions"
+        self._models_url = f"{self.base_url}/models"
 
     async def generate(self, prompt: str, model: str = "gpt-3.5-turbo", **kwargs) -> str:
         """Generate response with OpenAI"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": kwargs.get('max_tokens', 1000),
-                "temperature": kwargs.get('temperature', 0.7)
-            }
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    return result["choices"][0]["message"]["content"]
+            return await self._chat_completion(prompt, model, **kwargs)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"OpenAI generate error: {e}")
             return "❌ Error communicating with OpenAI."
 
+    async def generate_stream(self, prompt: str, model: str = "gpt-3.5-turbo", **kwargs) -> AsyncIterator[str]:
+        """Yield response text from OpenAI as it is generated (server-sent events)"""
+        async for text in self._chat_completion_stream(prompt, model, **kwargs):
+            yield text
+
     async def list_models(self) -> list[str]:
         """List available OpenAI models"""
+        cached = self._get_cached_models()
+        if cached is not None:
+            return cached
         try:
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/models",
-                    headers=headers,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    # Filter for chat models that might be free
-                    models = [m["id"] for m in data.get("data", [])]
-                    return [m for m in models if "gpt" in m.lower()]
+            data = await self._get_json(self._models_url, self._headers)
+            # Filter for chat models that might be free
+            models = [m["id"] for m in data.get("data", []) if m["id"].startswith(_OPENAI_CHAT_PREFIXES)]
+            return self._set_cached_models(models)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"OpenAI list models error: {e}")
             return ["gpt-3.5-turbo", "gpt-4"]  # Fallback
@@ -144,48 +463,32 @@ class GroqProvider(LLMProvider):
         super().__init__(timeout)
         self.api_key = api_key
         self.base_url = "https://api.groq.com/openai/v1"
+        self._headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self._generate_url = f"{self.base_url}/chat/completions"
+        self._models_url = f"{self.base_url}/models"
 
     async def generate(self, prompt: str, model: str = "llama2-70b-4096", **kwargs) -> str:
         """Generate response with Groq"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": kwargs.get('max_tokens', 1000),
-                "temperature": kwargs.get('temperature', 0.7)
-            }
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    return result["choices"][0]["message"]["content"]
+            return await self._chat_completion(prompt, model, **kwargs)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Groq generate error: {e}")
             return "❌ Error communicating with Groq."
 
+    async def generate_stream(self, prompt: str, model: str = "llama2-70b-4096", **kwargs) -> AsyncIterator[str]:
+        """Yield response text from Groq as it is generated (server-sent events)"""
+        async for text in self._chat_completion_stream(prompt, model, **kwargs):
+            yield text
+
     async def list_models(self) -> list[str]:
         """List available Groq models"""
+        cached = self._get_cached_models()
+        if cached is not None:
+            return cached
         try:
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/models",
-                    headers=headers,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    models = [m["id"] for m in data.get("data", [])]
-                    return models
+            data = await self._get_json(self._models_url, self._headers)
+            models = [m["id"] for m in data.get("data", [])]
+            return self._set_cached_models(models)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Groq list models error: {e}")
             return ["llama2-70b-4096", "mixtral-8x7b-32768"]  # Fallback
@@ -198,51 +501,51 @@ class TogetherProvider(LLMProvider):
         super().__init__(timeout)
         self.api_key = api_key
         self.base_url = "https://api.together.xyz/v1"
+        self._headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self._generate_url = f"{self.base_url}/completions"
+        self._models_url = f"{self.base_url}/models"
+
+    def _completion_payload(self, prompt: str, model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "prompt": prompt,  # Together AI uses prompt directly, not messages
+            "max_tokens": kwargs.get('max_tokens', 1000),
+            "temperature": kwargs.get('temperature', DEFAULT_TEMPERATURE),
+            "top_p": kwargs.get('top_p', 0.7),
+            "top_k": kwargs.get('top_k', 50),
+            "repetition_penalty": kwargs.get('repetition_penalty', 1.0)
+        }
 
     async def generate(self, prompt: str, model: str = "mistralai/Mixtral-8x7B-Instruct-v0.1", **kwargs) -> str:
         """Generate response with Together AI"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": model,
-                "prompt": prompt,  # Together AI uses prompt directly, not messages
-                "max_tokens": kwargs.get('max_tokens', 1000),
-                "temperature": kwargs.get('temperature', 0.7),
-                "top_p": kwargs.get('top_p', 0.7),
-                "top_k": kwargs.get('top_k', 50),
-                "repetition_penalty": kwargs.get('repetition_penalty', 1.0)
-            }
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    return result["choices"][0]["text"]
+            data = self._completion_payload(prompt, model, kwargs)
+            result = await self._post_json(self._generate_url, data, self._headers)
+            return result["choices"][0]["text"]
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Together AI generate error: {e}")
             return "❌ Error communicating with Together AI."
 
+    async def generate_stream(self, prompt: str, model: str = "mistralai/Mixtral-8x7B-Instruct-v0.1",
+                              **kwargs) -> AsyncIterator[str]:
+        """Yield response text from Together AI as it is generated (server-sent events)"""
+        data = self._completion_payload(prompt, model, kwargs)
+        data["stream"] = True
+        async for event in self._stream_sse(self._generate_url, data, self._headers):
+            choices = event.get("choices")
+            text = choices and choices[0].get("text")
+            if text:
+                yield text
+
     async def list_models(self) -> list[str]:
         """List available Together AI models"""
+        cached = self._get_cached_models()
+        if cached is not None:
+            return cached
         try:
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/models",
-                    headers=headers,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    models = [m["id"] for m in data if not m.get("deprecated", False)]
-                    return models
+            data = await self._get_json(self._models_url, self._headers)
+            models = [m["id"] for m in data if not m.get("deprecated", False)]
+            return self._set_cached_models(models)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Together AI list models error: {e}")
             return ["mistralai/Mixtral-8x7B-Instruct-v0.1", "meta-llama/Llama-2-70b-chat-hf"]  # Fallback
@@ -255,53 +558,58 @@ class HuggingFaceProvider(LLMProvider):
         super().__init__(timeout)
         self.api_key = api_key
         self.base_url = "https://api-inference.huggingface.co/models"
+        self._headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self._model_urls: Dict[str, str] = {}
 
     async def generate(self, prompt: str, model: str = "microsoft/DialoGPT-medium", **kwargs) -> str:
         """Generate response with Hugging Face"""
         try:
-            headers = {"Authorization": f"Bearer {self.api_key}"}
             data = {
                 "inputs": prompt,
                 "parameters": {
                     "max_new_tokens": kwargs.get('max_tokens', 100),
-                    "temperature": kwargs.get('temperature', 0.7),
+                    "temperature": kwargs.get('temperature', DEFAULT_TEMPERATURE),
                     "top_p": kwargs.get('top_p', 0.9),
                     "do_sample": True,
                     "return_full_text": False
                 },
                 "options": {"wait_for_model": True}
             }
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/{model}",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-
-                    # Handle different response formats
-                    if isinstance(result, list) and result:
-                        if "generated_text" in result[0]:
-                            return result[0]["generated_text"]
-                        elif "conversation" in result[0]:
-                            return result[0]["conversation"]["generated_responses"][-1]
-
-                    return str(result)
+            url = self._model_urls.get(model)
+            if url is None:
+                url = self._model_urls[model] = f"{self.base_url}/{model}"
+            result = await self._post_json(url, data, self._headers)
+
+            # A model always answers in the same shape; reuse the extractor found for it
+            extract = _hf_extractors.get(model)
+            if extract is not None:
+                try:
+                    return extract(result)
+                except (LookupError, TypeError):
+                    pass  # Different shape this time (e.g. an error payload); detect again
+            return self._extract_text(model, result)
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Hugging Face generate error: {e}")
             return "❌ Error communicating with Hugging Face."
 
+    @staticmethod
+    def _extract_text(model: str, result: Any) -> str:
+        """Pull the generated text out of a response, remembering the shape for the model"""
+        # Handle different response formats
+        match result:
+            case [{"generated_text": text}, *_]:
+                _hf_extractors[model] = _hf_generated_text
+                return text
+            case [{"conversation": {"generated_responses": [*_, last]}}, *_]:
+                _hf_extractors[model] = _hf_conversation_reply
+                return last
+            case _:
+                return str(result)
+
     async def list_models(self) -> list[str]:
         """List available Hugging Face models (simplified)"""
         # Hugging Face has too many models, return popular ones
-        return [
-            "microsoft/DialoGPT-medium",
-            "facebook/blenderbot-400M-distill",
-            "google/flan-t5-base",
-            "microsoft/DialoGPT-large"
-        ]
+        return list(_HUGGINGFACE_MODELS)
 
 
 class AnthropicProvider(LLMProvider):
@@ -311,50 +619,136 @@ class AnthropicProvider(LLMProvider):
         super().__init__(timeout)
         self.api_key = api_key
         self.base_url = "https://api.anthropic.com/v1"
+        self._headers = {
+            "x-api-key": api_key,
+            "Content-Type": "application/json",
+            "anthropic-version": "2023-06-01"
+        }
+        self._generate_url = f"{self.base_url}/messages"
+
+    def _messages_payload(self, prompt: str, model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "max_tokens": kwargs.get('max_tokens', 1000),
+            "messages": [{"role": "user", "content": prompt}]
+        }
 
     async def generate(self, prompt: str, model: str = "claude-3-haiku-20240307", **kwargs) -> str:
         """Generate response with Anthropic Claude"""
         try:
-            headers = {
-                "x-api-key": self.api_key,
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-            data = {
-                "model": model,
-                "max_tokens": kwargs.get('max_tokens', 1000),
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/messages",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    return result["content"][0]["text"]
+            data = self._messages_payload(prompt, model, kwargs)
+            result = await self._post_json(self._generate_url, data, self._headers)
+            return result["content"][0]["text"]
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Anthropic generate error: {e}")
             return "❌ Error communicating with Anthropic."
 
+    async def generate_stream(self, prompt: str, model: str = "claude-3-haiku-20240307",
+                              **kwargs) -> AsyncIterator[str]:
+        """Yield response text from Anthropic as it is generated (server-sent events)"""
+        data = self._messages_payload(prompt, model, kwargs)
+        data["stream"] = True
+        async for event in self._stream_sse(self._generate_url, data, self._headers):
+            event_type = event.get("type")
+            if event_type == "content_block_delta":
+                text = event.get("delta", {}).get("text")
+                if text:
+                    yield text
+            elif event_type == "message_stop":
+                break
+            elif event_type == "error":
+                raise aiohttp.ClientPayloadError(f"Anthropic error: {event.get('error')}")
+
     async def list_models(self) -> list[str]:
         """List available Anthropic models"""
         # Anthropic doesn't have a public models endpoint, return known models
-        return [
-            "claude-3-opus-20240229",
-            "claude-3-sonnet-20240229",
-            "claude-3-haiku-20240307",
-            "claude-2.1",
-            "claude-instant-1.2"
-        ]
+        return list(_ANTHROPIC_MODELS)
 
 
-class LLMClient:
-    """Multi-provider LLM client"""
+# Tool instructions appended to prompts by generate_with_tools; {tools_section} is the tool list
+_TOOLS_INSTRUCTIONS = """You have access to the following tools:
 
-    def __init__(self, provider_or_host: str = "ollama", model: Optional[str] = None, timeout: int = 30, **kwargs):
+{tools_section}
+
+To use a tool, respond with a JSON object in this format:
+TOOL_CALL: {{'tool': 'tool_name', 'parameters': {{'param1': 'value1', 'param2': 'value2'}}}} 
+
+You can make multiple tool calls if needed. After receiving tool results, provide your final answer.
+
+If you don't need to use any tools, just respond normally.
+"""
+
+# Rendered tool instructions keyed by tool list identity. Callers pass the same list
+# object every turn (bot.py rebuilds it only when the enabled plugins change), so the
+# lookup costs no serialization. Entries keep the list alive, so an id is never reused
+# while it is cached.
+TOOL_PROMPT_CACHE_SIZE = 64
+_tool_prompt_cache: OrderedDict[int, Tuple[list, str]] = OrderedDict()
+
+
+def _render_tools_instructions(tools: list) -> str:
+    lines = []
+    for tool in tools:
+        lines.append(f"- {tool.get('name', 'unknown')}: {tool.get('description', 'No description')}")
+        lines.extend(
+            f"  - {param_name} ({param_info.get('type', 'string')}): "
+            f"{param_info.get('description', 'No description')}"
+            for param_name, param_info in tool.get('parameters', {}).items()
+        )
+    return _TOOLS_INSTRUCTIONS.format(tools_section="\n".join(lines))
+
+
+def _tools_instructions(tools: list) -> str:
+    """Return the tool instructions for a tool list, rendering them on a cache miss"""
+    key = id(tools)
+    cached = _tool_prompt_cache.get(key)
+    if cached is not None and cached[0] is tools:
+        _tool_prompt_cache.move_to_end(key)
+        return cached[1]
+
+    rendered = _render_tools_instructions(tools)
+    _tool_prompt_cache[key] = (tools, rendered)
+    if len(_tool_prompt_cache) > TOOL_PROMPT_CACHE_SIZE:
+        _tool_prompt_cache.popitem(last=False)
+    return rendered
+
+
+# Provider name -> (class, required constructor option, error when that option is missing)
+_PROVIDERS: Dict[str, Tuple[type, Optional[str], Optional[str]]] = {
+    "ollama": (OllamaProvider, None, None),
+    "openai": (OpenAIProvider, "api_key", "OpenAI API key required"),
+    "groq": (GroqProvider, "api_key", "Groq API key required"),
+    "together": (TogetherProvider, "api_key", "Together AI API key required"),
+    "huggingface": (HuggingFaceProvider, "api_key", "Hugging Face API key required"),
+    "anthropic": (AnthropicProvider, "api_key", "Anthropic API key required"),
+}
+# Constructor parameter names of each provider class, read once
+_PROVIDER_PARAMS: Dict[type, Tuple[str, ...]] = {
+    cls: cls.__init__.__code__.co_varnames[1:cls.__init__.__code__.co_argcount]
+    for cls, _, _ in _PROVIDERS.values()
+}
+# Default model of each provider: the one its generate() falls back to
+_DEFAULT_MODELS: Dict[str, str] = {
+    name: cls.generate.__defaults__[0] for name, (cls, _, _) in _PROVIDERS.items()
+}
+
+
+class LLMClient:
+    """Multi-provider LLM client
+
+    Providers share one HTTP session per event loop. Only a client created with
+    ``owns_session=True`` (the bot's long-lived client, a test) closes that session
+    in close() or on leaving ``async with``; for any other client those are no-ops,
+    so short-lived per-message clients can't break requests of the others.
+    """
+
+    def __init__(self, provider_or_host: str = "ollama", model: Optional[str] = None, timeout: int = 30,
+                 cache: bool = True, owns_session: bool = False, **kwargs):
+        # Serve repeated low-temperature prompts from the shared response cache
+        self.cache = cache
+        self.owns_session = owns_session
+        # Callers pass the provider by keyword as well as positionally
+        provider_or_host = kwargs.pop('provider', None) or provider_or_host
         # Backward compatibility: if provider_or_host looks like a URL, treat as Ollama host
         if provider_or_host.startswith("http"):
             # Old OllamaClient signature
@@ -364,55 +758,119 @@ class LLMClient:
         else:
             # New signature
             self.provider_name = provider_or_host
-            # Remove provider from kwargs if it exists to avoid conflict
-            provider_kwargs = {k: v for k, v in kwargs.items() if k != 'provider'}
-            self.provider = self._create_provider(provider_or_host, model=model, timeout=timeout, **provider_kwargs)
-            self.model = kwargs.get('model', model or 'llama2')
+            self.provider = self._create_provider(provider_or_host, model=model, timeout=timeout, **kwargs)
+            self.model = model or _DEFAULT_MODELS[provider_or_host]
 
     def _create_provider(self, provider: str, **kwargs) -> LLMProvider:
         """Create provider instance"""
-        if provider == "ollama":
-            host = kwargs.get('host', 'http://localhost:11434')
-            logger.info(f"Creating Ollama provider with host: {host}")
-            return OllamaProvider(
-                host=host,
-                timeout=kwargs.get('timeout', 30)
-            )
-        elif provider == "openai":
-            api_key = kwargs.get('api_key')
-            if not api_key:
-                raise ValueError("OpenAI API key required")
-            return OpenAIProvider(api_key, kwargs.get('timeout', 30))
-        elif provider == "groq":
-            api_key = kwargs.get('api_key')
-            if not api_key:
-                raise ValueError("Groq API key required")
-            return GroqProvider(api_key, kwargs.get('timeout', 30))
-        elif provider == "together":
-            api_key = kwargs.get('api_key')
-            if not api_key:
-                raise ValueError("Together AI API key required")
-            return TogetherProvider(api_key, kwargs.get('timeout', 30))
-        elif provider == "huggingface":
-            api_key = kwargs.get('api_key')
-            if not api_key:
-                raise ValueError("Hugging Face API key required")
-            return HuggingFaceProvider(api_key, kwargs.get('timeout', 30))
-        elif provider == "anthropic":
-            api_key = kwargs.get('api_key')
-            if not api_key:
-                raise ValueError("Anthropic API key required")
-            return AnthropicProvider(api_key, kwargs.get('timeout', 30))
-        else:
-            raise ValueError(f"Unknown provider: {provider}")
+        try:
+            cls, required, missing_message = _PROVIDERS[provider]
+        except KeyError:
+            raise ValueError(f"Unknown provider: {provider}") from None
+        if required and not kwargs.get(required):
+            raise ValueError(missing_message)
+        # Unset (None) options fall back to the provider's own defaults
+        return cls(**{name: kwargs[name] for name in _PROVIDER_PARAMS[cls]
+                      if kwargs.get(name) is not None})
 
     async def generate(self, prompt: str, **kwargs) -> str:
         """Generate response using current provider"""
-        return await self.provider.generate(prompt, model=self.model, **kwargs)
+        if not self.cache or kwargs.get('temperature', DEFAULT_TEMPERATURE) > RESPONSE_CACHE_MAX_TEMPERATURE:
+            return await self.provider.generate(prompt, model=self.model, **kwargs)
+
+        if kwargs.get('context'):
+            # Continuation of an earlier Ollama exchange; its output depends on more than the prompt
+            return await self.provider.generate(prompt, model=self.model, **kwargs)
+
+        # Only cacheable calls need the sampling options bundled into a key
+        params = GenerateParams.from_kwargs(kwargs)
+        key = (
+            self.provider._models_cache_key(),
+            self.model,
+            hashlib.blake2b(prompt.encode(), digest_size=16).digest(),
+            params,
+        )
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _response_cache.move_to_end(key)
+            return cached
+
+        response = await _single_flight(
+            key, lambda: self.provider.generate(prompt, model=self.model, **kwargs)
+        )
+        # Providers report failures as "❌ ..." strings; never cache those
+        if not response.startswith("❌"):
+            _response_cache[key] = response
+            if len(_response_cache) > RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+        return response
+
+    async def generate_many(self, prompts: list[str], **kwargs) -> list[str]:
+        """Generate responses for several prompts concurrently, in prompt order"""
+        results = await asyncio.gather(*(self.generate(p, **kwargs) for p in prompts), return_exceptions=True)
+        responses = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"Batch generate error: {result}")
+                result = f"❌ Error communicating with the AI service: {result}"
+            responses.append(result)
+        return responses
+
+    async def generate_stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Stream response text using current provider (single chunk if it can't stream)"""
+        stream = getattr(self.provider, 'generate_stream', None)
+        if stream is None:
+            yield await self.generate(prompt, **kwargs)
+            return
+        async for chunk in stream(prompt, model=self.model, **kwargs):
+            yield chunk
 
     async def list_models(self) -> list[str]:
         """List available models for current provider"""
-        return await self.provider.list_models()
+        # Concurrent cache misses (e.g. several users opening /models at once) share one lookup
+        return await _single_flight(("list_models", self.provider._models_cache_key()), self.provider.list_models)
+
+    async def list_all_models(self, providers: Dict[str, Dict[str, Any]]) -> Dict[str, list[str]]:
+        """List models for several providers concurrently
+
+        Args:
+            providers: Provider name -> constructor options (host, api_key, ...)
+
+        Returns:
+            Provider name -> model list (empty for providers that could not be queried)
+        """
+        instances: Dict[str, LLMProvider] = {}
+        for name, options in providers.items():
+            if name == self.provider_name and not options:
+                instances[name] = self.provider
+                continue
+            try:
+                instances[name] = self._create_provider(name, **options)
+            except ValueError as e:
+                logger.warning(f"Skipping model listing for {name}: {e}")
+
+        results = await asyncio.gather(*(p.list_models() for p in instances.values()), return_exceptions=True)
+        models = {name: [] for name in providers}
+        for name, result in zip(instances, results):
+            if isinstance(result, BaseException):
+                logger.error(f"{name} list models error: {result}")
+            else:
+                models[name] = result
+        return models
+
+    async def close(self) -> None:
+        """Release HTTP resources; the shared session is closed only by its owner"""
+        await self.provider.close()
+        if self.owns_session:
+            await close_http_session()
+
+    aclose = close
+
+    async def __aenter__(self) -> "LLMClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
 
     def set_provider(self, provider: str, **kwargs):
         """Switch provider"""
@@ -451,58 +909,19 @@ class LLMClient:
 
     def _build_tool_prompt(self, original_prompt: str, tools: list) -> str:
         """Build a prompt that includes tool instructions"""
-        tool_descriptions = []
-        for tool in tools:
-            name = tool.get('name', 'unknown')
-            description = tool.get('description', 'No description')
-            parameters = tool.get('parameters', {})
-
-            # Format tool description
-            param_descs = []
-            for param_name, param_info in parameters.items():
-                param_type = param_info.get('type', 'string')
-                param_description = param_info.get('description', 'No description')
-                param_descs.append(f"  - {param_name} ({param_type}): {param_description}")
-
-            tool_descriptions.append(f"- {name}: {description}")
-            if param_descs:
-                tool_descriptions.extend(param_descs)
-
-        tools_section = "\n".join(tool_descriptions)
-
-        enhanced_prompt = f"""{original_prompt}
-
-You have access to the following tools:
-
-{tools_section}
-
-To use a tool, respond with a JSON object in this format:
-TOOL_CALL: {{'tool': 'tool_name', 'parameters': {{'param1': 'value1', 'param2': 'value2'}}}} 
-
-You can make multiple tool calls if needed. After receiving tool results, provide your final answer.
-
-If you don't need to use any tools, just respond normally.
-"""
-
-        return enhanced_prompt
+        return f"{original_prompt}\n\n{_tools_instructions(tools)}"
 
     def _parse_tool_calls(self, response: str) -> list:
         """Parse tool calls from LLM response"""
-        import re
-        import json
-
         tool_calls = []
 
-        # Look for TOOL_CALL: JSON patterns
-        tool_pattern = r'TOOL_CALL:\s*(\{.*?\})'
-        matches = re.findall(tool_pattern, response, re.DOTALL)
-
-        for match in matches:
+        # Decode exactly one JSON object after each TOOL_CALL: marker, whatever its nesting depth
+        for match in _TOOL_CALL_RE.finditer(response):
             try:
-                tool_call = json.loads(match.strip())
-                if isinstance(tool_call, dict) and 'tool' in tool_call:
-                    tool_calls.append(tool_call)
-            except json.JSONDecodeError:
+                tool_call, _ = _JSON_DECODER.raw_decode(response, match.end())
+            except ValueError:
                 continue
+            if isinstance(tool_call, dict) and 'tool' in tool_call:
+                tool_calls.append(tool_call)
 
         return tool_calls
@@ -1,15 +1,52 @@
 """Monitoring and metrics collection for Telegram Ollama Bot"""
 
+import asyncio
 import time
 import psutil
 import logging
-from typing import Dict, Any
-from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from typing import Dict, Any, Tuple
 from functools import wraps
+from sqlalchemy import text
 import os
 
 logger = logging.getLogger(__name__)
 
+try:
+    from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    logger.info("prometheus_client not installed; metrics are disabled")
+
+    class _NullMetric:
+        """Stand-in for Prometheus metrics that records nothing"""
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self, amount=1):
+            pass
+
+        def observe(self, amount):
+            pass
+
+        def set(self, value):
+            pass
+
+    Counter = Gauge = Histogram = _NullMetric
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def generate_latest(registry=None) -> bytes:
+        return b""
+
+# Histogram buckets (seconds). The library defaults top out at 10s, which most
+# LLM calls exceed; these are sized for chat handlers and model generation.
+REQUEST_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+AI_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
 # Prometheus metrics
 REQUEST_COUNT = Counter(
     'telegram_bot_requests_total',
@@ -20,7 +57,8 @@ REQUEST_COUNT = Counter(
 RESPONSE_TIME = Histogram(
     'telegram_bot_response_time_seconds',
     'Response time in seconds',
-    ['method', 'endpoint']
+    ['method', 'endpoint'],
+    buckets=REQUEST_LATENCY_BUCKETS
 )
 
 ACTIVE_USERS = Gauge(
@@ -43,7 +81,8 @@ AI_REQUESTS = Counter(
 AI_RESPONSE_TIME = Histogram(
     'telegram_bot_ai_response_time_seconds',
     'AI response time in seconds',
-    ['model']
+    ['model'],
+    buckets=AI_LATENCY_BUCKETS
 )
 
 MEMORY_USAGE = Gauge(
@@ -61,20 +100,28 @@ OLLAMA_STATUS = Gauge(
     'Ollama service status (1=up, 0=down)'
 )
 
+# Database liveness probe, built once
+_PING_SQL = text("SELECT 1")
+
 def track_request(method: str, endpoint: str):
     """Decorator to track API requests"""
     def decorator(func):
+        # Bind the label sets once; .labels() hashes its arguments on every call
+        success_count = REQUEST_COUNT.labels(method=method, endpoint=endpoint, status='success')
+        error_count = REQUEST_COUNT.labels(method=method, endpoint=endpoint, status='error')
+        response_time = RESPONSE_TIME.labels(method=method, endpoint=endpoint)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
                 result = await func(*args, **kwargs)
-                REQUEST_COUNT.labels(method=method, endpoint=endpoint, status='success').inc()
-                RESPONSE_TIME.labels(method=method, endpoint=endpoint).observe(time.time() - start_time)
+                success_count.inc()
+                response_time.observe(time.perf_counter() - start_time)
                 return result
             except Exception as e:
-                REQUEST_COUNT.labels(method=method, endpoint=endpoint, status='error').inc()
-                RESPONSE_TIME.labels(method=method, endpoint=endpoint).observe(time.time() - start_time)
+                error_count.inc()
+                response_time.observe(time.perf_counter() - start_time)
                 raise e
         return wrapper
     return decorator
@@ -82,14 +129,17 @@ def track_request(method: str, endpoint: str):
 def track_message(message_type: str):
     """Decorator to track message processing"""
     def decorator(func):
+        success_count = MESSAGE_COUNT.labels(type=message_type, status='success')
+        error_count = MESSAGE_COUNT.labels(type=message_type, status='error')
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             try:
                 result = await func(*args, **kwargs)
-                MESSAGE_COUNT.labels(type=message_type, status='success').inc()
+                success_count.inc()
                 return result
             except Exception as e:
-                MESSAGE_COUNT.labels(type=message_type, status='error').inc()
+                error_count.inc()
                 raise e
         return wrapper
     return decorator
@@ -97,17 +147,21 @@ def track_message(message_type: str):
 def track_ai_request(model: str):
     """Decorator to track AI requests"""
     def decorator(func):
+        success_count = AI_REQUESTS.labels(model=model, status='success')
+        error_count = AI_REQUESTS.labels(model=model, status='error')
+        response_time = AI_RESPONSE_TIME.labels(model=model)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
                 result = await func(*args, **kwargs)
-                AI_REQUESTS.labels(model=model, status='success').inc()
-                AI_RESPONSE_TIME.labels(model=model).observe(time.time() - start_time)
+                success_count.inc()
+                response_time.observe(time.perf_counter() - start_time)
                 return result
             except Exception as e:
-                AI_REQUESTS.labels(model=model, status='error').inc()
-                AI_RESPONSE_TIME.labels(model=model).observe(time.time() - start_time)
+                error_count.inc()
+                response_time.observe(time.perf_counter() - start_time)
                 raise e
         return wrapper
     return decorator
@@ -117,13 +171,15 @@ class SystemMonitor:
 
     def __init__(self):
         self.process = psutil.Process()
-        self.last_update = 0
+        # Prime the CPU counter so later interval=None calls measure usage since the previous call
+        self.process.cpu_percent(interval=None)
         self.update_interval = 30  # Update every 30 seconds
+        self._next_update_at = 0.0  # time.monotonic() deadline for the next refresh
 
     def update_metrics(self):
         """Update system metrics"""
-        current_time = time.time()
-        if current_time - self.last_update < self.update_interval:
+        now = time.monotonic()
+        if now < self._next_update_at:
             return
 
         try:
@@ -131,11 +187,11 @@ class SystemMonitor:
             memory_info = self.process.memory_info()
             MEMORY_USAGE.set(memory_info.rss)
 
-            # CPU usage (over 1 second interval)
-            cpu_percent = self.process.cpu_percent(interval=1.0)
+            # CPU usage since the previous update (non-blocking)
+            cpu_percent = self.process.cpu_percent(interval=None)
             CPU_USAGE.set(cpu_percent)
 
-            self.last_update = current_time
+            self._next_update_at = now + self.update_interval
 
         except Exception as e:
             logger.error(f"Failed to update system metrics: {e}")
@@ -147,73 +203,108 @@ class HealthChecker:
         self.ollama_host = ollama_host
         self.last_check = 0
         self.check_interval = 60  # Check every 60 seconds
+        # Keep-alive session reused across checks, created on first use
+        self._session = None
+        # SQLAlchemy engine for the database ping, resolved on first check
+        self._db_engine = None
+
+    async def _get_session(self):
+        """Return the health-check HTTP session, creating it if needed"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=5),
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=120)
+            )
+        return self._session
+
+    async def aclose(self):
+        """Close the health-check HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def check_ollama_health(self) -> bool:
         """Check if Ollama service is healthy"""
         try:
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.ollama_host}/api/tags", timeout=aiohttp.ClientTimeout(total=5)) as response:
-                    if response.status == 200:
-                        OLLAMA_STATUS.set(1)
-                        return True
-                    else:
-                        OLLAMA_STATUS.set(0)
-                        return False
+            session = await self._get_session()
+            async with session.get(f"{self.ollama_host}/api/tags") as response:
+                if response.status == 200:
+                    OLLAMA_STATUS.set(1)
+                    return True
+                else:
+                    OLLAMA_STATUS.set(0)
+                    return False
         except Exception as e:
             logger.error(f"Ollama health check failed: {e}")
             OLLAMA_STATUS.set(0)
             return False
 
-    async def comprehensive_health_check(self) -> Dict[str, Any]:
-        """Perform comprehensive health check"""
-        health_status = {
-            "status": "healthy",
-            "timestamp": time.time(),
-            "checks": {}
-        }
-
-        # Check Ollama
-        ollama_healthy = await self.check_ollama_health()
-        health_status["checks"]["ollama"] = {
-            "status": "healthy" if ollama_healthy else "unhealthy",
-            "details": f"Ollama service at {self.ollama_host}"
-        }
-
-        # Check database (if implemented)
+    def _db_check(self) -> Dict[str, Any]:
+        """Check database connectivity (blocking)"""
         try:
-            from database import get_db
-            db = next(get_db())
-            db.execute("SELECT 1")
-            health_status["checks"]["database"] = {
+            if self._db_engine is None:
+                from database import engine
+                self._db_engine = engine
+            # Check a pooled connection out and straight back in; no ORM session needed
+            with self._db_engine.connect() as conn:
+                conn.execute(_PING_SQL)
+            return {
                 "status": "healthy",
                 "details": "Database connection successful"
             }
         except Exception as e:
-            health_status["checks"]["database"] = {
+            return {
                 "status": "unhealthy",
                 "details": f"Database error: {str(e)}"
             }
-            health_status["status"] = "degraded"
 
-        # Check system resources
+    def _system_check(self) -> Tuple[Dict[str, Any], bool]:
+        """Check system resources (blocking: samples CPU for one second)
+
+        Returns the check result and whether memory or CPU is near saturation.
+        """
         try:
             memory = psutil.virtual_memory()
             cpu = psutil.cpu_percent(interval=1)
 
-            health_status["checks"]["system"] = {
+            return {
                 "status": "healthy",
                 "details": f"Memory: {memory.percent}%, CPU: {cpu}%"
-            }
-
-            if memory.percent > 90 or cpu > 95:
-                health_status["status"] = "warning"
-
+            }, memory.percent > 90 or cpu > 95
         except Exception as e:
-            health_status["checks"]["system"] = {
+            return {
                 "status": "unhealthy",
                 "details": f"System check error: {str(e)}"
-            }
+            }, False
+
+    async def comprehensive_health_check(self) -> Dict[str, Any]:
+        """Perform comprehensive health check"""
+        health_status = {
+            "status": "healthy",
+            "timestamp": time.time(),
+            "checks": {}
+        }
+
+        # Run the checks concurrently; the blocking ones go to worker threads
+        ollama_healthy, db_check, (system_check, overloaded) = await asyncio.gather(
+            self.check_ollama_health(),
+            asyncio.to_thread(self._db_check),
+            asyncio.to_thread(self._system_check)
+        )
+
+        health_status["checks"]["ollama"] = {
+            "status": "healthy" if ollama_healthy else "unhealthy",
+            "details": f"Ollama service at {self.ollama_host}"
+        }
+
+        health_status["checks"]["database"] = db_check
+        if db_check["status"] == "unhealthy":
+            health_status["status"] = "degraded"
+
+        health_status["checks"]["system"] = system_check
+        if overloaded:
+            health_status["status"] = "warning"
 
         # Set overall status
         if any(check["status"] == "unhealthy" for check in health_status["checks"].values()):
@@ -221,9 +312,21 @@ class HealthChecker:
 
         return health_status
 
+# Serialized metrics are reused for this long; scrapes rarely come closer together
+METRICS_CACHE_TTL = 1.0
+_cached_metrics: Tuple[float, bytes] = (float('-inf'), b"")
+
+
 def get_metrics():
     """Get current metrics in Prometheus format"""
-    return generate_latest()
+    global _cached_metrics
+    now = time.monotonic()
+    generated_at, body = _cached_metrics
+    if now - generated_at < METRICS_CACHE_TTL:
+        return body
+    body = generate_latest()
+    _cached_metrics = (now, body)
+    return body
 
 # Global instances
 system_monitor = SystemMonitor()
@@ -6,15 +6,21 @@ import base64
 import io
 from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
-import tempfile
-import os
+import wave
 
 from PIL import Image
 import speech_recognition as sr
-from pydub import AudioSegment
 
 logger = logging.getLogger(__name__)
 
+try:
+    # SIMD-accelerated base64 (SSSE3/AVX2/AVX-512, picked at runtime)
+    import pybase64
+    _b64encode_str = pybase64.b64encode_as_string
+except ImportError:
+    def _b64encode_str(data) -> str:
+        return base64.b64encode(data).decode('ascii')
+
 class ImageProcessor:
     """Process and analyze images"""
 
@@ -25,14 +31,19 @@ class ImageProcessor:
 
     async def process_image(self, image_data: bytes, filename: str = "") -> Dict[str, Any]:
         """Process uploaded image and extract information"""
-        try:
-            # Validate file size
-            if len(image_data) > self.max_file_size:
-                return {
-                    "success": False,
-                    "error": f"Image too large. Maximum size: {self.max_file_size // (1024*1024)}MB"
-                }
+        # Validate file size
+        if len(image_data) > self.max_file_size:
+            return {
+                "success": False,
+                "error": f"Image too large. Maximum size: {self.max_file_size // (1024*1024)}MB"
+            }
+
+        # Decoding, resizing and re-encoding are CPU-bound; keep them off the event loop
+        return await asyncio.to_thread(self._process_image_sync, image_data, filename)
 
+    def _process_image_sync(self, image_data: bytes, filename: str) -> Dict[str, Any]:
+        """Decode, downscale and JPEG/base64-encode an image (blocking)"""
+        try:
             # Open image
             image = Image.open(io.BytesIO(image_data))
 
@@ -53,12 +64,24 @@ class ImageProcessor:
                 "file_size_bytes": len(image_data)
             }
 
+            too_large = image.size[0] > self.max_image_size[0] or image.size[1] > self.max_image_size[1]
+            if not too_large and image.format == 'JPEG' and image.mode == 'RGB':
+                # Already a small RGB JPEG: Image.open only read the header, so pass the
+                # original bytes through instead of decoding and re-encoding them
+                info["base64_data"] = _b64encode_str(image_data)
+                return info
+
+            if too_large and image.format == 'JPEG':
+                # Let the JPEG decoder scale down by 1/2-1/8 while decoding instead of
+                # decoding full resolution and resampling it all afterwards
+                image.draft('RGB', self.max_image_size)
+
             # Convert to RGB if necessary for processing
             if image.mode != 'RGB':
                 image = image.convert('RGB')
 
             # Resize if too large
-            if image.size[0] > self.max_image_size[0] or image.size[1] > self.max_image_size[1]:
+            if too_large:
                 image.thumbnail(self.max_image_size, Image.Resampling.LANCZOS)
                 info["resized"] = True
                 info["original_size"] = info["size"]
@@ -67,7 +90,7 @@ class ImageProcessor:
             # Convert to base64 for AI processing
             buffer = io.BytesIO()
             image.save(buffer, format='JPEG', quality=85)
-            info["base64_data"] = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            info["base64_data"] = _b64encode_str(buffer.getbuffer())
 
             return info
 
@@ -100,9 +123,28 @@ Please provide a comprehensive but concise description."""
             logger.error(f"Image description generation error: {e}")
             return "❌ Failed to analyze image."
 
+# ffmpeg input format for common voice MIME types; anything else is probed by ffmpeg
+_FFMPEG_INPUT_FORMATS = {
+    "audio/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/mp4": "mp4",
+    "audio/x-m4a": "mp4",
+}
+
+
 class VoiceProcessor:
     """Process voice messages and convert to text"""
 
+    # ffmpeg output: 16 kHz mono signed 16-bit PCM, the format speech recognition expects
+    sample_rate = 16000
+    sample_width = 2
+
     def __init__(self):
         self.recognizer = sr.Recognizer()
         self.max_duration = 300  # 5 minutes max
@@ -111,45 +153,31 @@ class VoiceProcessor:
     async def process_voice(self, voice_data: bytes, mime_type: str = "audio/ogg") -> Dict[str, Any]:
         """Process voice message and convert to text"""
         try:
-            # Save voice data to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as temp_file:
-                temp_file.write(voice_data)
-                temp_path = temp_file.name
-
-            try:
-                # Convert audio if needed
-                audio_path = await self._convert_audio(temp_path, mime_type)
-
-                # Perform speech recognition
-                with sr.AudioFile(audio_path) as source:
-                    audio = self.recognizer.record(source)
-
-                    # Try different recognition engines
-                    text = ""
-                    try:
-                        text = self.recognizer.recognize_google(audio)
-                    except sr.UnknownValueError:
-                        text = "Could not understand audio"
-                    except sr.RequestError as e:
-                        logger.error(f"Speech recognition service error: {e}")
-                        text = "Speech recognition service unavailable"
-
-                    # Get audio duration
-                    audio_segment = AudioSegment.from_file(audio_path)
-                    duration = len(audio_segment) / 1000  # Convert to seconds
-
-                    return {
-                        "success": True,
-                        "text": text,
-                        "duration_seconds": duration,
-                        "confidence": getattr(audio, '_confidence', None)
-                    }
-
-            finally:
-                # Clean up temporary files
-                for path in [temp_path, audio_path]:
-                    if os.path.exists(path):
-                        os.unlink(path)
+            # Convert to PCM in memory, telling ffmpeg the input format when the MIME type is known
+            input_format = _FFMPEG_INPUT_FORMATS.get(mime_type.split(';')[0].strip().lower())
+            pcm = await self._convert_audio(voice_data, input_format)
+            duration = len(pcm) / (self.sample_rate * self.sample_width)
+
+            # Perform speech recognition
+            with sr.AudioFile(self._wav_buffer(pcm)) as source:
+                audio = self.recognizer.record(source)
+
+                # Try different recognition engines
+                text = ""
+                try:
+                    text = self.recognizer.recognize_google(audio)
+                except sr.UnknownValueError:
+                    text = "Could not understand audio"
+                except sr.RequestError as e:
+                    logger.error(f"Speech recognition service error: {e}")
+                    text = "Speech recognition service unavailable"
+
+                return {
+                    "success": True,
+                    "text": text,
+                    "duration_seconds": duration,
+                    "confidence": getattr(audio, '_confidence', None)
+                }
 
         except Exception as e:
             logger.error(f"Voice processing error: {e}")
@@ -158,29 +186,31 @@ class VoiceProcessor:
                 "error": f"Failed to process voice message: {type(e).__name__}"
             }
 
-    async def _convert_audio(self, input_path: str, mime_type: str) -> str:
-        """Convert audio to WAV format for speech recognition"""
-        try:
-            # Load audio with pydub
-            if mime_type == "audio/ogg":
-                audio = AudioSegment.from_ogg(input_path)
-            elif mime_type in ["audio/mp3", "audio/mpeg"]:
-                audio = AudioSegment.from_mp3(input_path)
-            elif mime_type == "audio/wav":
-                return input_path  # Already WAV
-            else:
-                # Try to detect format automatically
-                audio = AudioSegment.from_file(input_path)
-
-            # Convert to WAV
-            output_path = input_path + '.wav'
-            audio.export(output_path, format='wav')
-
-            return output_path
-
-        except Exception as e:
-            logger.error(f"Audio conversion error: {e}")
-            return input_path  # Return original if conversion fails
+    async def _convert_audio(self, voice_data: bytes, input_format: Optional[str] = None) -> bytes:
+        """Decode audio to raw PCM with a single ffmpeg process over pipes"""
+        input_args = ("-f", input_format) if input_format else ()
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-loglevel", "error", *input_args, "-i", "pipe:0",
+            "-f", "s16le", "-ar", str(self.sample_rate), "-ac", "1", "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        pcm, stderr = await proc.communicate(voice_data)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='ignore').strip()}")
+        return pcm
+
+    def _wav_buffer(self, pcm: bytes) -> io.BytesIO:
+        """Wrap raw PCM in an in-memory WAV file"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(self.sample_width)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm)
+        buffer.seek(0)
+        return buffer
 
 class FileProcessor:
     """Process uploaded files and documents"""
@@ -194,6 +224,12 @@ class FileProcessor:
             'audio': ['.mp3', '.wav', '.ogg', '.m4a', '.flac'],
             'video': ['.mp4', '.avi', '.mov', '.mkv']
         }
+        # Flat extension -> file type index for single-probe lookups
+        self._ext_to_type = {
+            ext: file_type
+            for file_type, extensions in self.allowed_extensions.items()
+            for ext in extensions
+        }
 
     async def process_file(self, file_data: bytes, filename: str, mime_type: str = "") -> Dict[str, Any]:
         """Process uploaded file and extract information"""
@@ -230,8 +266,11 @@ class FileProcessor:
             # For text files, try to extract content
             if file_type == 'text' and file_size < 1024 * 1024:  # 1MB limit for text extraction
                 try:
-                    text_content = file_data.decode('utf-8', errors='ignore')
-                    if len(text_content) > 5000:  # Truncate long files
+                    # Only the first 5000 characters are kept; at most 4 UTF-8 bytes each,
+                    # so decode just that prefix rather than the whole file
+                    prefix_bytes = 4 * 5000
+                    text_content = str(memoryview(file_data)[:prefix_bytes], 'utf-8', 'ignore')
+                    if len(text_content) > 5000 or file_size > prefix_bytes:  # Truncate long files
                         text_content = text_content[:5000] + "...\n[Content truncated]"
                     result["content"] = text_content
                     result["content_length"] = len(text_content)
@@ -249,10 +288,7 @@ class FileProcessor:
 
     def _get_file_type(self, extension: str) -> Optional[str]:
         """Determine file type from extension"""
-        for file_type, extensions in self.allowed_extensions.items():
-            if extension in extensions:
-                return file_type
-        return None
+        return self._ext_to_type.get(extension)
 
     async def summarize_file(self, ollama_client, file_info: Dict[str, Any]) -> str:
         """Generate AI summary of file content"""
@@ -1,63 +1,54 @@
 """Ollama client for AI model interactions"""
 
-import asyncio
 import logging
-import requests
+from typing import AsyncIterator
+
+from llm_client import OllamaProvider, close_http_session
 
 logger = logging.getLogger(__name__)
 
 
 class OllamaClient:
-    """Client for interacting with Ollama API"""
+    """Client for interacting with Ollama API
+
+    Requests go through OllamaProvider, so they share the pooled keep-alive
+    aiohttp session and its retry-with-backoff policy. close() only closes that
+    session when this client owns it (owns_session=True).
+    """
 
-    def __init__(self, host: str, model: str, timeout: int = 30):
+    def __init__(self, host: str, model: str, timeout: int = 30, retries: int = 3,
+                 owns_session: bool = False):
         self.host = host.rstrip("/")
         self.model = model
-        self.timeout = timeout
-
-    async def generate(self, prompt: str, retries: int = 3) -> str:
-        """Generate response with retry logic"""
-        for attempt in range(retries):
-            try:
-                response = await asyncio.to_thread(
-                    requests.post,
-                    f"{self.host}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                    },
-                    timeout=self.timeout,
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data.get("response", "No response returned.")
-            except requests.Timeout:
-                if attempt < retries - 1:
-                    logger.warning(f"Ollama timeout (attempt {attempt + 1}/{retries}), retrying...")
-                    await asyncio.sleep(1)  # Brief pause before retry
-                    continue
-                else:
-                    logger.error(f"Ollama timeout after {retries} attempts")
-                    return "❌ AI service timeout. Please try again later."
-            except requests.RequestException as e:
-                logger.error(f"Ollama generate error: {e}")
-                return "❌ Error communicating with the AI service."
-
-        # This should never be reached, but added for type safety
-        return "❌ Unexpected error occurred."
+        self.retries = retries
+        self.owns_session = owns_session
+        self._provider = OllamaProvider(host=self.host, timeout=timeout)
+
+    @property
+    def timeout(self) -> int:
+        return self._provider.timeout
+
+    @timeout.setter
+    def timeout(self, value: int) -> None:
+        self._provider.timeout = value
+
+    async def generate(self, prompt: str) -> str:
+        """Generate response (transient failures are retried with backoff)"""
+        return await self._provider.generate(prompt, model=self.model, retries=self.retries)
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield response text as Ollama generates it"""
+        async for chunk in self._provider.generate_stream(prompt, model=self.model):
+            yield chunk
 
     async def list_models(self) -> list[str]:
         """List available models"""
-        try:
-            response = await asyncio.to_thread(
-                requests.get,
-                f"{self.host}/api/tags",
-                timeout=self.timeout,
-            )
-            response.raise_for_status()
-            data = response.json()
-            return [m["name"] for m in data.get("models", [])]
-        except requests.RequestException as e:
-            logger.error(f"Ollama list models error: {e}")
-            return []
\ No newline at end of file
+        return await self._provider.list_models()
+
+    async def close(self) -> None:
+        """Close pooled HTTP connections, if this client owns the shared session"""
+        await self._provider.close()
+        if self.owns_session:
+            await close_http_session()
+
+    aclose = close
@@ -3,7 +3,8 @@ Personality system for the bot - different conversation modes and styles.
 """
 
 import logging
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from enum import Enum
 
 logger = logging.getLogger(__name__)
@@ -24,6 +25,9 @@ class PersonalityManager:
 
     def __init__(self):
         self.personalities = self._load_personalities()
+        # Combined prompts for (personality, base prompt) pairs; channels reuse the same few
+        self._prompt_cache: OrderedDict[Tuple[Personality, str], str] = OrderedDict()
+        self._prompt_cache_max = 256
 
     def _load_personalities(self) -> Dict[Personality, Dict[str, str]]:
         """Load personality configurations."""
@@ -66,12 +70,20 @@ class PersonalityManager:
 
     def get_system_prompt(self, personality: Personality, base_prompt: str = "") -> str:
         """Get the full system prompt for a personality."""
-        personality_config = self.get_personality(personality)
+        if not base_prompt:
+            return self.get_personality(personality)['prompt']
 
-        if base_prompt:
-            return f"{personality_config['prompt']}\n\n{base_prompt}"
-        else:
-            return personality_config['prompt']
+        key = (personality, base_prompt)
+        cache = self._prompt_cache
+        prompt = cache.get(key)
+        if prompt is not None:
+            cache.move_to_end(key)
+            return prompt
+
+        prompt = cache[key] = f"{self.get_personality(personality)['prompt']}\n\n{base_prompt}"
+        if len(cache) > self._prompt_cache_max:
+            cache.popitem(last=False)
+        return prompt
 
     def list_personalities(self) -> Dict[str, Dict[str, str]]:
         """List all available personalities."""
@@ -442,14 +442,8 @@ class TelegramPlugin(Plugin):
             if not 10 <= new_limit <= 1000:
                 raise ValueError("Context limit out of range")
 
-            # Update the conversation manager
-            self.bot.conversation_manager.max_messages_per_user = new_limit
-
-            # Also update the deque maxlen for existing conversations
-            for chat_id, conversation in self.bot.conversation_manager.conversations.items():
-                # Create new deque with updated maxlen and copy existing messages
-                new_deque = deque(conversation, maxlen=new_limit)
-                self.bot.conversation_manager.conversations[chat_id] = new_deque
+            # Update the conversation manager (also resizes existing conversations)
+            self.bot.conversation_manager.set_max_messages(new_limit)
 
             if update.message:
                 await update.message.reply_text(
@@ -13,34 +13,48 @@ import json
 
 from constants import (
     ARTICLE_MAX_TEXT_LENGTH, TRANSCRIPT_MAX_LENGTH,
-    NEWS_SITE_PATTERNS, YOUTUBE_URL_PATTERNS
+    YOUTUBE_URL_REGEX, is_news_site
 )
 from security import InputValidator
 
 logger = logging.getLogger(__name__)
 
+# Generic http(s) URL pattern shared by the news and YouTube extractors
+URL_REGEX = re.compile(
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+)
+
 
 class NewsSummarizer:
     """Handles news article summarization using Ollama AI"""
 
     def __init__(self, ollama_client):
         self.ollama = ollama_client
-        # Common news site patterns
-        self.news_regex = re.compile('|'.join(NEWS_SITE_PATTERNS), re.IGNORECASE)
         self.validator = InputValidator()
+        # Keep-alive requests session for the readability fallback, created on first use
+        self._requests_session = None
+
+    def _get_requests_session(self):
+        """Return the pooled requests session, creating it on first use"""
+        if self._requests_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._requests_session = session
+        return self._requests_session
 
     def extract_urls(self, text: str) -> list[str]:
         """Extract URLs from text and filter for news sites"""
-        # URL pattern
-        url_pattern = re.compile(
-            r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        )
-        urls = url_pattern.findall(text)
+        urls = URL_REGEX.findall(text)
 
         # Filter for news sites
         news_urls = []
         for url in urls:
-            if self.news_regex.search(url):
+            if is_news_site(url):
                 news_urls.append(url)
 
         return news_urls
@@ -299,9 +313,10 @@ class NewsSummarizer:
             # Method 2: Try with readability-based extraction
             try:
                 from readability import Document
-                import requests
 
-                response = requests.get(url, headers=headers, timeout=30)
+                response = await asyncio.to_thread(
+                    self._get_requests_session().get, url, headers=headers, timeout=30
+                )
                 if response.status_code == 200:
                     doc = Document(response.text)
                     title = doc.title()
@@ -426,16 +441,12 @@ class YouTubeSummarizer:
     def __init__(self, ollama_client):
         self.ollama = ollama_client
         # YouTube URL patterns
-        self.youtube_regex = re.compile('|'.join(YOUTUBE_URL_PATTERNS), re.IGNORECASE)
+        self.youtube_regex = YOUTUBE_URL_REGEX
         self.validator = InputValidator()
 
     def extract_video_urls(self, text: str) -> list[str]:
         """Extract YouTube URLs from text"""
-        # URL pattern
-        url_pattern = re.compile(
-            r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        )
-        urls = url_pattern.findall(text)
+        urls = URL_REGEX.findall(text)
 
         # Filter for YouTube URLs
         youtube_urls = []